@@ -0,0 +1,102 @@
+#--------------------------------------------#
+#------------- BATCH RENDERING --------------#
+#--------------------------------------------#
+
+import os
+import json
+import time
+import logging
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from config import *
+from data import get_collection, timestamp_key
+from render import build_paths, write_svg, pendown_distance, penup_distance
+
+def timestamp_datetime(timestamp):
+	# document timestamp as a datetime, reading large numbers as javascript milliseconds
+	if isinstance(timestamp, datetime):
+		return timestamp
+	seconds = timestamp_key(timestamp)
+	return datetime.fromtimestamp(seconds / 1000 if seconds > 1e11 else seconds)
+
+def partition_documents(documents, partition_by="day", sheet_size=BATCH_SHEET_SIZE):
+	# group a timestamp-ordered stream of documents into sheets, yielding each one as soon as it is complete
+	# "day" starts a new sheet every calendar day, "count" every sheet_size documents - either way no sheet holds more than sheet_size
+	sheet = []
+	key = None
+	part = 0
+	for document in documents:
+		document_key = timestamp_datetime(document["timestamp"]).strftime("%Y-%m-%d") if partition_by == "day" else "sheet"
+		if sheet and (document_key != key or len(sheet) >= sheet_size):
+			yield f"{key}_{part:04d}", sheet
+			part = part + 1 if document_key == key else 0
+			sheet = []
+		key = document_key
+		sheet.append(document)
+	if sheet:
+		yield f"{key}_{part:04d}", sheet
+
+def render_sheet(filename, documents):
+	# runs in a worker process - renders one sheet and returns its stats for the manifest
+	start = time.perf_counter()
+	paths = build_paths(documents)
+	write_svg(filename, paths)
+	return {
+		"filename": filename,
+		"documents": len(documents),
+		"first_timestamp": str(documents[0]["timestamp"]),
+		"last_timestamp": str(documents[-1]["timestamp"]),
+		"paths": len(paths),
+		"vertices": sum(len(path) for path in paths),
+		"pendown_distance_inches": pendown_distance(paths) / SVG_DPI,
+		"penup_distance_inches": penup_distance(paths) / SVG_DPI,
+		"svg_bytes": os.path.getsize(filename),
+		"seconds": time.perf_counter() - start
+	}
+
+def render_batch(partition_by="day", sheet_size=BATCH_SHEET_SIZE, workers=BATCH_WORKERS, collection=None, output_directory=None):
+	# render the whole collection into one svg per sheet across a process pool, writing a manifest with per-sheet stats
+	workers = workers or os.cpu_count()
+	output_directory = output_directory or f"{DIRECTORY_PATH}/outputs/batch_{int(time.time())}"
+	os.makedirs(output_directory, exist_ok=True)
+
+	logging.info(f"Starting batch render by {partition_by} into {output_directory} with {workers} workers")
+
+	if collection is None:
+		collection = get_collection()
+
+	# stream the documents oldest first, only holding the sheets that are waiting on or in the pool
+	cursor = collection.find({}, {"pos": 1, "timestamp": 1}, allow_disk_use=True).sort("timestamp", 1).batch_size(sheet_size)
+
+	sheets = []
+	start = time.perf_counter()
+	with ProcessPoolExecutor(workers) as executor:
+		in_flight = {}
+		for key, documents in partition_documents(cursor, partition_by, sheet_size):
+			if len(in_flight) >= 2 * workers:
+				done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+				for future in done:
+					sheets.append({"sheet": in_flight.pop(future), **future.result()})
+			in_flight[executor.submit(render_sheet, f"{output_directory}/{key}.svg", documents)] = key
+		for future in in_flight:
+			sheets.append({"sheet": in_flight[future], **future.result()})
+
+	sheets.sort(key=lambda sheet: sheet["sheet"])
+	manifest = {
+		"partition_by": partition_by,
+		"sheet_size": sheet_size,
+		"workers": workers,
+		"seconds": time.perf_counter() - start,
+		"documents": sum(sheet["documents"] for sheet in sheets),
+		"sheets": sheets
+	}
+	manifest_filename = f"{output_directory}/manifest.json"
+	with open(manifest_filename, "w", encoding="utf-8") as file:
+		json.dump(manifest, file, indent=4)
+
+	logging.info(f"Rendered {len(sheets)} sheets from {manifest['documents']} documents in {manifest['seconds']:.1f}s, manifest saved to {manifest_filename}")
+
+	return manifest_filename
+
+#--------------------------------------------#
@@ -0,0 +1,294 @@
+#------------------------------------------#
+#--------------- BENCHMARKS ---------------#
+#------------------------------------------#
+
+# usage: python benchmark.py [mapping] [svg] [startup] [render] [--hardware] [--scales 10 40 160] [--output results.json]
+
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import config
+import render
+
+def reflect(value, low, high):
+	# fold a random walk back into the range at its edges
+	span = high - low
+	value = (value - low) % (2 * span)
+	return low + (value if value <= span else 2 * span - value)
+
+def generate_documents(count, seed=0, out_of_bounds_fraction=0.05, start_timestamp=1700000000000):
+	# random walks shaped like the mongodb documents, reflecting inside the data ranges widened so that
+	# about the given fraction of points lies outside them - walks near an edge drift past it for a run of points
+	rng = random.Random(seed)
+	# widen both ranges by the same share, so the widened area outside the data ranges is the given fraction
+	inside = math.sqrt(1 - out_of_bounds_fraction)
+	x_margin = (config.X_DATA_IN_MAX - config.X_DATA_IN_MIN) * (1 / inside - 1) / 2
+	y_margin = (config.Y_DATA_IN_MAX - config.Y_DATA_IN_MIN) * (1 / inside - 1) / 2
+	x_low, x_high = config.X_DATA_IN_MIN - x_margin, config.X_DATA_IN_MAX + x_margin
+	y_low, y_high = config.Y_DATA_IN_MIN - y_margin, config.Y_DATA_IN_MAX + y_margin
+	documents = []
+	for index in range(count):
+		x = rng.uniform(x_low, x_high)
+		y = rng.uniform(y_low, y_high)
+		positions = []
+		for _ in range(rng.randint(50, 300)):
+			x = reflect(x + rng.gauss(0, 0.1), x_low, x_high)
+			y = reflect(y + rng.gauss(0, 0.1), y_low, y_high)
+			positions.append({"x": x, "y": y})
+		# javascript millisecond timestamps, a minute apart
+		documents.append({"pos": positions, "timestamp": start_timestamp + index * 60000})
+	return documents
+
+def legacy_map_documents(data, boundingBox):
+	# the original per-point loop from create_svg, kept as the reference
+	mapRange = render.mapRange
+	paths = []
+	for document in data:
+		path_positions = []
+		for posIndex, position in enumerate(document["pos"]):
+			x = mapRange(float(position["x"]), config.X_DATA_IN_MIN, config.X_DATA_IN_MAX, boundingBox['x'] + boundingBox['w'], boundingBox['x'])
+			y = mapRange(float(position["y"]), config.Y_DATA_IN_MIN, config.Y_DATA_IN_MAX, boundingBox['y'], boundingBox['y'] + boundingBox['h'])
+			if x > boundingBox["x"] and x < boundingBox["x"] + boundingBox["w"] and y > boundingBox["y"] and y < boundingBox["y"] + boundingBox["h"]:
+				path_positions.append({"x": x, "y": y})
+			if x < boundingBox["x"] or x > boundingBox["x"] + boundingBox["w"] or y < boundingBox["y"] or y > boundingBox["y"] + boundingBox["h"] or posIndex == len(document["pos"]) - 1:
+				if len(path_positions) > 1:
+					paths.append(path_positions)
+				path_positions = []
+	return paths
+
+def time_call(function, *args, repeat=3):
+	best = float("inf")
+	for _ in range(repeat):
+		start = time.perf_counter()
+		function(*args)
+		best = min(best, time.perf_counter() - start)
+	return best
+
+def benchmark_mapping(counts=(40, 1000, 10000)):
+	boundingBox = render.get_bounding_box()
+	print("mapping + clipping (best of 3)")
+	for count in counts:
+		data = generate_documents(count)
+		legacy = time_call(legacy_map_documents, data, boundingBox)
+		vectorized = time_call(render.map_documents, data, boundingBox)
+		print(f"	{count} documents: legacy {legacy:.3f}s, vectorized {vectorized:.3f}s ({legacy / vectorized:.1f}x)")
+
+def legacy_write_svg(filename, paths):
+	# the original svgwrite dom and pretty-printed save, kept as the reference
+	import svgwrite
+	svg = svgwrite.Drawing(
+		filename=filename,
+		size=(f"{config.SVG_WIDTH_INCHES}in", f"{config.SVG_HEIGHT_INCHES}in"),
+		viewBox=(f"0 0 {config.SVG_WIDTH_PIXELS} {config.SVG_HEIGHT_PIXELS}"),
+		profile="full"
+	)
+	for path in paths:
+		path_string = ""
+		for index, (px, py) in enumerate(path.tolist()):
+			if index == 0:
+				path_string += f"M{px},{py}"
+			else:
+				path_string += f" L{px},{py}"
+		svg.add(svg.path(d=path_string, stroke="#000", fill="none", stroke_width=1))
+	svg.save(pretty=True, indent=4)
+	return filename
+
+def measure_svg_writer(writer_name, count, queue):
+	# runs in a fresh process so the peak rss belongs to this writer alone
+	writer = legacy_write_svg if writer_name == "legacy" else render.write_svg
+	paths = render.map_documents(generate_documents(count), render.get_bounding_box())
+	with tempfile.TemporaryDirectory() as directory:
+		filename = os.path.join(directory, "output.svg")
+
+		start = time.perf_counter()
+		writer(filename, paths)
+		seconds = time.perf_counter() - start
+		size = os.path.getsize(filename)
+
+		# second pass to measure the memory allocated while writing
+		tracemalloc.start()
+		writer(filename, paths)
+		_, peak_allocated = tracemalloc.get_traced_memory()
+		tracemalloc.stop()
+
+	queue.put({
+		"seconds": seconds,
+		"bytes": size,
+		"peak_allocated_bytes": peak_allocated,
+		"peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	})
+
+def benchmark_svg_writing(counts=(40, 1000, 10000)):
+	context = multiprocessing.get_context("spawn")
+	print("svg writing (legacy svgwrite vs streaming writer)")
+	for count in counts:
+		for writer_name in ("legacy", "streaming"):
+			queue = context.Queue()
+			process = context.Process(target=measure_svg_writer, args=(writer_name, count, queue))
+			process.start()
+			result = queue.get()
+			process.join()
+			print(f"	{count} documents, {writer_name}: {result['seconds']:.3f}s, {result['bytes'] / 1024:.0f}KiB, {result['peak_allocated_bytes'] / 1024 / 1024:.1f}MiB allocated while writing, process peak rss {result['peak_rss_kb'] / 1024:.1f}MiB")
+
+def measure_cold_start(code, repeat=5):
+	# best wall time for a fresh interpreter to run the code, from launch until it prints "ready"
+	best = float("inf")
+	for _ in range(repeat):
+		start = time.perf_counter()
+		process = subprocess.Popen([sys.executable, "-c", code], cwd=config.DIRECTORY_PATH, stdout=subprocess.PIPE, text=True)
+		line = process.stdout.readline()
+		seconds = time.perf_counter() - start
+		process.kill()
+		process.wait()
+		if line.strip() != "ready":
+			raise RuntimeError(f"cold start failed: {code}")
+		best = min(best, seconds)
+	return best
+
+def benchmark_startup(hardware=False):
+	# with hardware, also times the real startup - importing gpiozero and pyaxidraw and arming the gpio buttons - which needs the pi
+	ready = "print('ready', flush=True)"
+	print("cold start (best of 5)")
+	print(f"	interpreter: {measure_cold_start(ready):.3f}s")
+	print(f"	import render pipeline: {measure_cold_start('import render; ' + ready):.3f}s")
+	# logs and checkpoints go to a temporary directory and nothing is fetched, so the benchmark leaves the installation untouched
+	with tempfile.TemporaryDirectory() as directory:
+		def armed(fake_hardware):
+			return f"import log, run; log.DIRECTORY_PATH = {directory!r}; run.start(fake_hardware={fake_hardware}, prerender=False, checkpoint_path={os.path.join(directory, 'plot_checkpoint.json')!r}); "
+		print(f"	buttons armed (fake hardware): {measure_cold_start(armed(True) + ready):.3f}s")
+		if hardware:
+			print(f"	buttons armed (hardware): {measure_cold_start(armed(False) + ready):.3f}s")
+
+def measure_render(count, seed, out_of_bounds_fraction, queue):
+	# runs in a fresh process so the peak rss belongs to this render alone
+	import log
+	data = generate_documents(count, seed, out_of_bounds_fraction)
+	baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	with tempfile.TemporaryDirectory() as directory:
+		# collect the stage timings the pipeline already records
+		log.timing_filename = os.path.join(directory, "timing.jsonl")
+		filename = os.path.join(directory, "output.svg")
+
+		start = time.perf_counter()
+		paths = render.build_paths(data)
+		render.write_svg(filename, paths)
+		seconds = time.perf_counter() - start
+
+		with open(log.timing_filename, encoding="utf-8") as file:
+			stages = {record["stage"]: record["seconds"] for record in map(json.loads, file)}
+		size = os.path.getsize(filename)
+
+	queue.put({
+		"seconds": seconds,
+		"stage_seconds": stages,
+		"input_paths": count,
+		"input_vertices": sum(len(document["pos"]) for document in data),
+		"output_paths": len(paths),
+		"output_vertices": sum(len(path) for path in paths),
+		"svg_bytes": size,
+		"baseline_rss_kb": baseline_rss,
+		"peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	})
+
+def git_commit():
+	try:
+		return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def benchmark_render(counts=(10, 40, 160), repeat=3, seed=0, out_of_bounds_fraction=0.05, output=None):
+	# the full render path at each scale, written as json to compare across commits and machines
+	import numpy as np
+	context = multiprocessing.get_context("spawn")
+	results = {
+		"time": time.time(),
+		"commit": git_commit(),
+		"machine": {
+			"hostname": platform.node(),
+			"platform": platform.platform(),
+			"processor": platform.machine(),
+			"cpus": os.cpu_count(),
+			"python": platform.python_version(),
+			"numpy": np.__version__
+		},
+		"settings": {
+			"repeat": repeat,
+			"seed": seed,
+			"out_of_bounds_fraction": out_of_bounds_fraction,
+			"simplify_tolerance_inches": config.SIMPLIFY_TOLERANCE_INCHES,
+			"simplify_tolerance_steps": config.SIMPLIFY_TOLERANCE_STEPS,
+			"dedup_max_overdraws": config.DEDUP_MAX_OVERDRAWS,
+			"path_optimize": config.PATH_OPTIMIZE,
+			"path_optimize_time_limit": config.PATH_OPTIMIZE_TIME_LIMIT,
+			"svg_precision": config.SVG_PRECISION,
+			"svg_draw_titles": config.SVG_DRAW_TITLES
+		},
+		"scales": []
+	}
+
+	print(f"render path (best of {repeat})")
+	for count in counts:
+		runs = []
+		for _ in range(repeat):
+			queue = context.Queue()
+			process = context.Process(target=measure_render, args=(count, seed, out_of_bounds_fraction, queue))
+			process.start()
+			runs.append(queue.get())
+			process.join()
+		best = min(runs, key=lambda run: run["seconds"])
+		results["scales"].append({
+			"documents": count,
+			**best,
+			"all_seconds": [run["seconds"] for run in runs],
+			"peak_rss_kb": max(run["peak_rss_kb"] for run in runs)
+		})
+		print(f"	{count} documents: {best['seconds']:.3f}s, {best['input_vertices']} -> {best['output_vertices']} vertices, {best['output_paths']} paths, {best['svg_bytes'] / 1024:.0f}KiB, peak rss {results['scales'][-1]['peak_rss_kb'] / 1024:.1f}MiB")
+
+	output = output or f"{config.DIRECTORY_PATH}/benchmarks/{int(results['time'])}_{results['commit'] or 'unknown'}_render.json"
+	os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+	with open(output, "w", encoding="utf-8") as file:
+		json.dump(results, file, indent=4)
+	print(f"	results saved to {output}")
+	return output
+
+if __name__ == "__main__":
+
+	import argparse
+
+	suites = {
+		"mapping": benchmark_mapping,
+		"svg": benchmark_svg_writing,
+		"startup": benchmark_startup,
+		"render": benchmark_render
+	}
+
+	parser = argparse.ArgumentParser()
+	parser.add_argument("suites", nargs="*", help=f"benchmarks to run from {', '.join(suites)}, all of them by default")
+	parser.add_argument("--scales", type=int, nargs="+", default=[10, 40, 160], help="document counts for the render benchmark")
+	parser.add_argument("--repeat", type=int, default=3, help="runs per scale for the render benchmark, the fastest is kept")
+	parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic documents")
+	parser.add_argument("--out-of-bounds", type=float, default=0.05, help="rough fraction of synthetic points outside the data ranges")
+	parser.add_argument("--output", help="json file for the render benchmark results")
+	parser.add_argument("--hardware", action="store_true", help="also time the startup benchmark with the real gpio buttons and axidraw, on the pi")
+	args = parser.parse_args()
+	for suite in args.suites:
+		if suite not in suites:
+			parser.error(f"unknown benchmark: {suite}")
+
+	for suite in args.suites or suites:
+		if suite == "render":
+			benchmark_render(args.scales, args.repeat, args.seed, args.out_of_bounds, args.output)
+		elif suite == "startup":
+			benchmark_startup(args.hardware)
+		else:
+			suites[suite]()
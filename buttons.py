@@ -0,0 +1,23 @@
+#--------------------------------------------#
+#------------- BUTTON DETECTION -------------#
+#--------------------------------------------#
+
+def create_button(pin, fake=False):
+	# gpiozero is only imported here, so everything else loads on machines without gpio pins
+	if fake:
+		return FakeButton(pin)
+	from gpiozero import Button
+	return Button(pin)
+
+class FakeButton:
+	# stands in for gpiozero.Button without hardware - call press() to simulate a visitor pressing it
+
+	def __init__(self, pin):
+		self.pin = pin
+		self.when_pressed = None
+
+	def press(self):
+		if self.when_pressed is not None:
+			self.when_pressed()
+
+#--------------------------------------------#
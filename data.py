@@ -0,0 +1,99 @@
+#-------------------------------------------#
+#------------ MONGODB DATA PULL ------------#
+#-------------------------------------------#
+
+import os
+import logging
+from bson import json_util
+from datetime import datetime
+import sqlite3
+
+from config import *
+from log import timed_stage
+
+# one client for the life of the process, created on the first pull
+mongo_client = None
+
+def get_collection():
+	global mongo_client
+
+	if mongo_client is None:
+
+		# pymongo is only imported once it is needed, it takes a while to load on the pi
+		from pymongo.mongo_client import MongoClient
+		from pymongo.server_api import ServerApi
+
+		with timed_stage("mongo_connect"):
+
+			# create a new client
+			mongo_client = MongoClient(ATLAS_URI, server_api=ServerApi("1"), serverSelectionTimeoutMS=ATLAS_TIMEOUT_MS, socketTimeoutMS=ATLAS_TIMEOUT_MS)
+
+			# Send a ping to confirm a successful connection
+			try:
+				mongo_client.admin.command("ping")
+				logging.info("Pinged your deployment. Successfully connected to MongoDB...")
+			except Exception as e:
+				logging.error(e)
+
+	# get the database and collection
+	return mongo_client[ATLAS_DB_NAME][ATLAS_COLLECTION_NAME]
+
+def open_cache(cache_path=CACHE_PATH):
+	os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+	cache = sqlite3.connect(cache_path)
+	cache.execute("CREATE TABLE IF NOT EXISTS documents (id TEXT PRIMARY KEY, timestamp REAL, document TEXT)")
+	cache.execute("CREATE INDEX IF NOT EXISTS documents_timestamp ON documents (timestamp)")
+	return cache
+
+def timestamp_key(timestamp):
+	# sortable number for a document timestamp, which may be a number, a date or an iso string
+	if isinstance(timestamp, datetime):
+		return timestamp.timestamp()
+	if isinstance(timestamp, str):
+		try:
+			return float(timestamp)
+		except ValueError:
+			return datetime.fromisoformat(timestamp).timestamp()
+	return float(timestamp)
+
+def get_data(collection=None, cache_path=CACHE_PATH):
+	from pymongo.errors import PyMongoError
+
+	logging.info("Starting data pull from MongoDB")
+
+	cache = open_cache(cache_path)
+
+	try:
+
+		# only ask for documents newer than the newest cached one
+		newest = cache.execute("SELECT document FROM documents ORDER BY timestamp DESC LIMIT 1").fetchone()
+		query = {} if newest is None else {"timestamp": {"$gt": json_util.loads(newest[0])["timestamp"]}}
+
+		# add new documents to the cache - https://pymongo.readthedocs.io/en/stable/tutorial.html
+		try:
+			if collection is None:
+				collection = get_collection()
+			with timed_stage("fetch") as timing:
+				documents = list(collection.find(query, {"pos": 1, "timestamp": 1}, limit=ATLAS_DOCUMENT_LIMIT).sort("timestamp", -1))
+				timing["documents"] = len(documents)
+			with cache:
+				cache.executemany(
+					"INSERT OR REPLACE INTO documents VALUES (?, ?, ?)",
+					[(str(document["_id"]), timestamp_key(document["timestamp"]), json_util.dumps(document)) for document in documents]
+				)
+			logging.info(f"Fetched {len(documents)} new documents from MongoDB")
+		except PyMongoError as e:
+			logging.error(e)
+			logging.info("Falling back to the local document cache")
+
+		# read the newest documents back out of the cache
+		rows = cache.execute("SELECT document FROM documents ORDER BY timestamp DESC LIMIT ?", (ATLAS_DOCUMENT_LIMIT,)).fetchall()
+
+	finally:
+		cache.close()
+
+	logging.info(f"Loaded {len(rows)} documents from the cache")
+
+	return [json_util.loads(row[0]) for row in rows]
+
+#-------------------------------------------#
@@ -0,0 +1,108 @@
+#-------------------------------------------#
+#-------------- LOGGING SETUP --------------#
+#-------------------------------------------#
+
+import os
+import logging
+import time
+import json
+import threading
+from contextlib import contextmanager
+
+from config import *
+
+# structured per-stage timings, written as json lines next to the current log
+timing_filename = None
+timing_lock = threading.Lock()
+
+# timestamp of the current log, so files made while it is open can be named after it
+current_timestamp = None
+
+def create_log():
+	global timing_filename, current_timestamp
+
+	log_timestamp = int(time.time())
+	os.makedirs(f"{DIRECTORY_PATH}/logs", exist_ok=True)
+	timing_filename = f"{DIRECTORY_PATH}/logs/{log_timestamp}_timing.jsonl"
+
+	# swap the handlers in one assignment rather than removing them one at a time, so the
+	# pre-render thread logging meanwhile writes to either the old log or the new one
+	handler = logging.FileHandler(f"{DIRECTORY_PATH}/logs/{log_timestamp}_log.txt", encoding="utf-8")
+	handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+	previous_handlers = logging.root.handlers
+	logging.root.handlers = [handler]
+	logging.root.setLevel(logging.DEBUG)
+	for previous_handler in previous_handlers:
+		previous_handler.close()
+
+	current_timestamp = log_timestamp
+
+	logging.info("config:")
+	logging.info("	mongodb:")
+	logging.info(f"		ATLAS_URI: {ATLAS_URI}")
+	logging.info(f"		ATLAS_DB_NAME: {ATLAS_DB_NAME}")
+	logging.info(f"		ATLAS_COLLECTION_NAME: {ATLAS_COLLECTION_NAME}")
+	logging.info(f"		ATLAS_DOCUMENT_LIMIT: {ATLAS_DOCUMENT_LIMIT}")
+	logging.info(f"		ATLAS_TIMEOUT_MS: {ATLAS_TIMEOUT_MS}")
+	logging.info(f"		CACHE_PATH: {CACHE_PATH}")
+	logging.info("	svg:")
+	logging.info(f"		SVG_WIDTH_INCHES: {SVG_WIDTH_INCHES}")
+	logging.info(f"		SVG_HEIGHT_INCHES: {SVG_HEIGHT_INCHES}")
+	logging.info(f"		SVG_DPI: {SVG_DPI}")
+	logging.info(f"		SVG_WIDTH_PIXELS: {SVG_WIDTH_PIXELS}")
+	logging.info(f"		SVG_HEIGHT_PIXELS: {SVG_HEIGHT_PIXELS}")
+	logging.info(f"		SVG_PRECISION: {SVG_PRECISION}")
+	logging.info(f"		SVG_RELATIVE_PATHS: {SVG_RELATIVE_PATHS}")
+	logging.info(f"		SVG_SUBPATHS_PER_PATH: {SVG_SUBPATHS_PER_PATH}")
+	logging.info(f"		SVG_DRAW_TITLES: {SVG_DRAW_TITLES}")
+	logging.info("	path simplification:")
+	logging.info(f"		AXIDRAW_STEPS_PER_INCH: {AXIDRAW_STEPS_PER_INCH}")
+	logging.info(f"		SIMPLIFY_TOLERANCE_INCHES: {SIMPLIFY_TOLERANCE_INCHES}")
+	logging.info(f"		SIMPLIFY_TOLERANCE_STEPS: {SIMPLIFY_TOLERANCE_STEPS}")
+	logging.info("	stroke deduplication:")
+	logging.info(f"		PEN_WIDTH_INCHES: {PEN_WIDTH_INCHES}")
+	logging.info(f"		DEDUP_MAX_OVERDRAWS: {DEDUP_MAX_OVERDRAWS}")
+	logging.info(f"		DEDUP_ANGLE_TOLERANCE: {DEDUP_ANGLE_TOLERANCE}")
+	logging.info(f"		DEDUP_MIN_GAP_INCHES: {DEDUP_MIN_GAP_INCHES}")
+	logging.info("	path optimization:")
+	logging.info(f"		PATH_OPTIMIZE: {PATH_OPTIMIZE}")
+	logging.info(f"		PATH_OPTIMIZE_TIME_LIMIT: {PATH_OPTIMIZE_TIME_LIMIT}")
+	logging.info(f"		PATH_JOIN_TOLERANCE_PIXELS: {PATH_JOIN_TOLERANCE_PIXELS}")
+	logging.info("	pre-render:")
+	logging.info(f"		PRERENDER_INTERVAL_SECONDS: {PRERENDER_INTERVAL_SECONDS}")
+	logging.info("	batch rendering:")
+	logging.info(f"		BATCH_SHEET_SIZE: {BATCH_SHEET_SIZE}")
+	logging.info(f"		BATCH_WORKERS: {BATCH_WORKERS}")
+	logging.info("	axidraw:")
+	logging.info(f"		PLOT_BACKEND: {PLOT_BACKEND}")
+	logging.info(f"		PLOT_CHUNK_VERTICES: {PLOT_CHUNK_VERTICES}")
+	logging.info("	checkpoints:")
+	logging.info(f"		CHECKPOINT_PATH: {CHECKPOINT_PATH}")
+	logging.info(f"		CHECKPOINT_INTERVAL_SECONDS: {CHECKPOINT_INTERVAL_SECONDS}")
+	logging.info(f"		AXIDRAW_OPTIONS: \n{json.dumps(AXIDRAW_OPTIONS, indent=4)}")
+
+	return log_timestamp
+
+def current_log_timestamp():
+	# timestamp of the current log, or of now if no log has been created
+	return current_timestamp if current_timestamp is not None else int(time.time())
+
+def record_timing(record):
+	record = {"time": time.time(), **record}
+	logging.info(f"Timing: {json.dumps(record)}")
+	if timing_filename is not None:
+		with timing_lock, open(timing_filename, "a", encoding="utf-8") as file:
+			file.write(json.dumps(record) + "\n")
+
+@contextmanager
+def timed_stage(stage, **sizes):
+	# times the block and records it with any sizes passed in or added to the yielded dict
+	record = {"stage": stage, **sizes}
+	start = time.perf_counter()
+	try:
+		yield record
+	finally:
+		record["seconds"] = time.perf_counter() - start
+		record_timing(record)
+
+#-------------------------------------------#
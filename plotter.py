@@ -0,0 +1,229 @@
+#-------------------------------------------#
+#------------- AXIDRAW CONTROL -------------#
+#-------------------------------------------#
+
+import time
+import types
+import logging
+import threading
+import numpy as np
+
+from config import *
+from log import timed_stage
+
+def create_axidraw(fake=False):
+	# pyaxidraw is only imported here, so the render pipeline loads on machines without it
+	if fake:
+		return FakeAxiDraw()
+	from pyaxidraw import axidraw
+	return axidraw.AxiDraw()
+
+# axidraw error code when a plot was stopped with its pause button - https://axidraw.com/doc/py_api/#error-handling
+AXIDRAW_PAUSED_CODE = 102
+
+def configure_options(axi):
+	# configure plot context
+	# axi.options.speed_pendown = AXIDRAW_OPTIONS["speed_pendown"]
+	# axi.options.speed_penup = AXIDRAW_OPTIONS["speed_penup"]
+	# axi.options.accel = AXIDRAW_OPTIONS["accel"]
+	axi.options.pen_pos_down = AXIDRAW_OPTIONS["pen_pos_down"]
+	axi.options.pen_pos_up = AXIDRAW_OPTIONS["pen_pos_up"]
+	# axi.options.pen_rate_lower = AXIDRAW_OPTIONS["pen_rate_lower"]
+	# axi.options.pen_rate_raise = AXIDRAW_OPTIONS["pen_rate_raise"]
+	# axi.options.pen_delay_down = AXIDRAW_OPTIONS["pen_delay_down"]
+	# axi.options.pen_delay_up = AXIDRAW_OPTIONS["pen_delay_up"]
+	axi.options.const_speed = AXIDRAW_OPTIONS["const_speed"]
+	axi.options.model = AXIDRAW_OPTIONS["model"]
+	# axi.options.penlift = AXIDRAW_OPTIONS["penlift"]
+	# axi.options.port = AXIDRAW_OPTIONS["port"]
+	# axi.options.port_config = AXIDRAW_OPTIONS["port_config"]
+
+def estimate_plot(axi, svg_filename):
+	# dry run in preview mode - reports how long the plot would take without moving the machine
+	axi.plot_setup(svg_filename)
+	configure_options(axi)
+	axi.options.preview = True
+	axi.options.report_time = True
+	with timed_stage("estimate") as timing:
+		axi.plot_run()
+		timing.update(
+			estimated_seconds=axi.time_estimate,
+			pendown_distance_m=axi.distance_pendown,
+			total_distance_m=axi.distance_total,
+			pen_lifts=axi.pen_lifts
+		)
+	return timing
+
+class InteractivePlotter:
+	# sends in-memory paths straight to the axidraw with the interactive api - https://axidraw.com/doc/py_api/#interactive-context
+	# keeps its own cursor so a paused plot can carry on from the next path
+
+	def __init__(self, axi):
+		self.axi = axi
+		self.paths = []
+		self.cursor = 0		# index of the next path to draw
+		self.vertex = 0		# index of the last vertex reached in that path, when it was left part drawn
+		self.pause_event = threading.Event()
+		self.time_to_first_stroke = None
+		self.on_progress = None	# called after each planned move
+
+	def load(self, paths, cursor=0, vertex=0):
+		# paths in svg pixels, plotted in inches
+		self.paths = [np.asarray(path) / SVG_DPI for path in paths]
+		self.cursor = cursor
+		self.vertex = vertex
+		self.time_to_first_stroke = None
+
+	def position(self):
+		# pen position in inches, at the last vertex reached
+		if self.vertex > 0:
+			return self.paths[self.cursor][self.vertex].tolist()
+		return [0, 0] if self.cursor == 0 else self.paths[self.cursor - 1][-1].tolist()
+
+	def pause(self):
+		self.pause_event.set()
+
+	def finished(self):
+		return self.cursor >= len(self.paths)
+
+	def paused(self):
+		return 0 < len(self.paths) and not self.finished()
+
+	def button_pressed(self):
+		# the pause button on the axidraw itself - QB reports whether it was pressed since the last query
+		return self.axi.usb_query("QB\r").strip().startswith("1")
+
+	def plot(self, started_at=None):
+		# plot from the cursor until every path is drawn or the plot is paused, leaving the axidraw connected for home()
+		# returns True once the plot is finished
+		self.pause_event.clear()
+
+		self.axi.interactive()
+		configure_options(self.axi)
+		if not self.axi.connect():
+			raise RuntimeError("Could not connect to the AxiDraw")
+
+		try:
+			self.button_pressed() # clear any earlier press
+			while not self.finished():
+				if self.pause_event.is_set() or self.button_pressed():
+					logging.info(f"Plot paused before path {self.cursor + 1} of {len(self.paths)}")
+					return False
+
+				# each run of vertices is one planned move, carrying on from the last vertex reached for a path cut short by a power cut
+				path = self.paths[self.cursor]
+				while self.vertex < len(path) - 1:
+					end = min(self.vertex + PLOT_CHUNK_VERTICES - 1, len(path) - 1)
+					self.axi.draw_path(path[self.vertex:end + 1].tolist())
+					self.vertex = end
+					if self.time_to_first_stroke is None and started_at is not None:
+						self.time_to_first_stroke = time.monotonic() - started_at
+						logging.info(f"Time to first stroke: {self.time_to_first_stroke:.2f}s")
+					if self.on_progress is not None:
+						self.on_progress()
+				self.cursor += 1
+				self.vertex = 0
+				if self.on_progress is not None:
+					self.on_progress()
+
+			logging.info(f"Plotted {len(self.paths)} paths")
+			return True
+
+		except Exception:
+			self.home()
+			raise
+
+	def home(self):
+		# raise the pen, return to the home position and let go of the axidraw
+		self.axi.moveto(0, 0)
+		self.axi.disconnect()
+
+class FakeAxiDraw:
+	# stands in for axidraw.AxiDraw without hardware, recording every command it is sent
+
+	def __init__(self):
+		self.options = types.SimpleNamespace()
+		self.commands = []
+		self.position = (0, 0)
+		self.pen_is_up = True
+		self.button_presses = 0 # pending presses of the pause button
+		self.kill_after = None	# number of line segments drawn before simulating a power cut
+		self.errors = types.SimpleNamespace(code=0)
+		# preview results, as set by plot_run with options.preview
+		self.time_estimate = None
+		self.distance_pendown = None
+		self.distance_total = None
+		self.pen_lifts = None
+
+	def plot_setup(self, svg_input=None):
+		self.commands.append(("plot_setup", svg_input))
+		self.options = types.SimpleNamespace()
+
+	def plot_run(self, output=False):
+		mode = getattr(self.options, "mode", "plot")
+		self.commands.append(("plot_run", mode))
+		self.errors.code = 0
+		if getattr(self.options, "preview", False):
+			# nothing moves in preview mode, and there is no motion planner to estimate with
+			self.time_estimate = 0.0
+			self.distance_pendown = 0.0
+			self.distance_total = 0.0
+			self.pen_lifts = 0
+			return "<svg/>" if output else None
+		# a pending button press pauses plots, as the real pause button does
+		if mode in ("plot", "res_plot") and self.button_presses > 0:
+			self.button_presses -= 1
+			self.errors.code = AXIDRAW_PAUSED_CODE
+		return "<svg/>" if output else None
+
+	def interactive(self):
+		self.commands.append(("interactive",))
+		self.options = types.SimpleNamespace()
+
+	def connect(self):
+		self.commands.append(("connect",))
+		return True
+
+	def disconnect(self):
+		self.commands.append(("disconnect",))
+
+	def penup(self):
+		self.pen_is_up = True
+
+	def pendown(self):
+		self.pen_is_up = False
+
+	def moveto(self, x, y):
+		self.penup()
+		self.position = (x, y)
+		self.commands.append(("moveto", x, y))
+
+	def lineto(self, x, y):
+		self.draw_segments(1)
+		self.pendown()
+		self.position = (x, y)
+		self.commands.append(("lineto", x, y))
+
+	def draw_path(self, vertex_list):
+		# moves to the first vertex, draws through the rest and raises the pen again
+		vertices = [tuple(vertex) for vertex in vertex_list]
+		self.draw_segments(len(vertices) - 1)
+		self.penup()
+		self.position = vertices[-1]
+		self.commands.append(("draw_path", vertices))
+
+	def draw_segments(self, count):
+		# a power cut part way through a move loses the whole move
+		if self.kill_after is not None:
+			if self.kill_after < count:
+				self.kill_after = 0
+				raise RuntimeError("FakeAxiDraw killed")
+			self.kill_after -= count
+
+	def usb_query(self, query):
+		if query == "QB\r" and self.button_presses > 0:
+			self.button_presses -= 1
+			return "1\r\n"
+		return "0\r\n"
+
+#-------------------------------------------#
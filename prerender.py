@@ -0,0 +1,123 @@
+#--------------------------------------------#
+#------------ BACKGROUND PRE-RENDER ---------#
+#--------------------------------------------#
+
+import time
+import logging
+import threading
+
+from config import *
+from log import current_log_timestamp
+from data import get_data, timestamp_key
+from render import build_paths, write_svg
+
+def data_signature(data):
+	# identifies a set of documents, so the svg is only rebuilt when it changes
+	return tuple((str(document["_id"]), timestamp_key(document["timestamp"])) for document in data)
+
+class Prerenderer:
+	# keeps the next svg rendered ahead of time so a button press can plot it straight away
+
+	def __init__(self, interval=PRERENDER_INTERVAL_SECONDS, backend=PLOT_BACKEND):
+		self.interval = interval
+		self.backend = backend
+		self.prepared = None	# {"filename", "paths", "signature", "built_at", "build_seconds"}
+		self.lock = threading.Lock()
+		self.render_lock = threading.Lock()
+		self.stop_event = threading.Event()
+		self.wake_event = threading.Event()
+		self.thread = None
+
+	def start(self):
+		self.thread = threading.Thread(target=self.loop, name="prerender", daemon=True)
+		self.thread.start()
+
+	def stop(self):
+		self.stop_event.set()
+		self.wake_event.set()
+		if self.thread is not None:
+			self.thread.join()
+
+	def request_refresh(self):
+		# check for new data now rather than at the next interval
+		self.wake_event.set()
+
+	def loop(self):
+		while not self.stop_event.is_set():
+			try:
+				self.refresh()
+			except Exception as e:
+				logging.exception(e)
+			self.wake_event.wait(self.interval)
+			self.wake_event.clear()
+
+	def refresh(self, on_render=None):
+		# pull new data and rebuild the svg if it changed
+		with self.render_lock:
+			return self.build(on_render)
+
+	def build(self, on_render=None):
+		# only called with render_lock held
+		data = get_data()
+		signature = data_signature(data)
+
+		with self.lock:
+			if self.prepared is not None and self.prepared["signature"] == signature:
+				return self.prepared
+
+		if on_render is not None:
+			on_render()
+
+		start = time.monotonic()
+		logging.info("Starting SVG creation")
+		paths = build_paths(data)
+		# named after the log the render is recorded in, so the two can be matched up
+		filename = f"{DIRECTORY_PATH}/outputs/{current_log_timestamp()}_{int(time.time())}_output.svg"
+		if self.backend == "interactive":
+			# the svg is only an archive copy here, so keep it off the critical path
+			threading.Thread(target=write_svg, args=(filename, paths), name="archive", daemon=True).start()
+		else:
+			write_svg(filename, paths)
+		prepared = {
+			"filename": filename,
+			"paths": paths,
+			"signature": signature,
+			"built_at": time.monotonic(),
+			"build_seconds": time.monotonic() - start
+		}
+
+		# swap in the new svg only once it is completely written
+		with self.lock:
+			self.prepared = prepared
+
+		logging.info(f"Pre-rendered {len(paths)} paths for {filename} in {prepared['build_seconds']:.2f}s")
+
+		return prepared
+
+	def take(self, on_render=None):
+		# the prepared svg, rendering one now if the worker hasn't finished its first build
+		prepared = self.get_prepared()
+		if prepared is not None:
+			return prepared
+		with self.render_lock:
+			# the worker may have finished its build while we waited for it, so don't fetch the data again
+			prepared = self.get_prepared()
+			if prepared is not None:
+				return prepared
+			return self.build(on_render)
+
+	def get_prepared(self):
+		with self.lock:
+			return self.prepared
+
+	def age(self):
+		# seconds since the prepared svg was built
+		with self.lock:
+			return None if self.prepared is None else time.monotonic() - self.prepared["built_at"]
+
+	def build_seconds(self):
+		# how long the prepared svg took to build
+		with self.lock:
+			return None if self.prepared is None else self.prepared["build_seconds"]
+
+#--------------------------------------------#
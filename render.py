@@ -0,0 +1,639 @@
+#--------------------------------------------#
+#------------ PATH SIMPLIFICATION -----------#
+#--------------------------------------------#
+
+import os
+import math
+import time
+import logging
+import numpy as np
+
+from config import *
+from log import timed_stage
+
+def get_simplify_tolerance():
+	# tolerance in svg pixels
+	if SIMPLIFY_TOLERANCE_STEPS is not None:
+		return SIMPLIFY_TOLERANCE_STEPS / AXIDRAW_STEPS_PER_INCH * SVG_DPI
+	return SIMPLIFY_TOLERANCE_INCHES * SVG_DPI
+
+def segment_distances(points, start, end):
+	# distance from each point to the segment start-end
+	direction = end - start
+	length_squared = np.dot(direction, direction)
+	if length_squared == 0:
+		return np.hypot(*(points - start).T)
+	t = np.clip((points - start) @ direction / length_squared, 0, 1)
+	return np.hypot(*(points - (start + t[:, None] * direction)).T)
+
+def simplify_path(path, tolerance):
+	# ramer-douglas-peucker - https://en.wikipedia.org/wiki/Ramer%E2%80%93Douglas%E2%80%93Peucker_algorithm
+	# returns the simplified path and its maximum deviation from the original
+	if len(path) < 3:
+		return path, 0.0
+
+	keep = np.zeros(len(path), dtype=bool)
+	keep[0] = keep[-1] = True
+	max_deviation = 0.0
+
+	stack = [(0, len(path) - 1)]
+	while stack:
+		first, last = stack.pop()
+		if last - first < 2:
+			continue
+		deviations = segment_distances(path[first + 1:last], path[first], path[last])
+		index = int(np.argmax(deviations))
+		if deviations[index] > tolerance:
+			split = first + 1 + index
+			keep[split] = True
+			stack.append((first, split))
+			stack.append((split, last))
+		else:
+			max_deviation = max(max_deviation, float(deviations[index]))
+
+	return path[keep], max_deviation
+
+def simplify_paths(paths):
+	tolerance = get_simplify_tolerance()
+	if tolerance <= 0 or not paths:
+		return paths
+
+	logging.info("Starting path simplification")
+
+	vertices_before = sum(len(path) for path in paths)
+
+	simplified = []
+	max_deviation = 0.0
+	for path in paths:
+		path, deviation = simplify_path(path, tolerance)
+		simplified.append(path)
+		max_deviation = max(max_deviation, deviation)
+
+	vertices_after = sum(len(path) for path in simplified)
+
+	logging.info(f"Vertices: {vertices_before} -> {vertices_after}")
+	logging.info(f"Maximum deviation: {max_deviation / SVG_DPI:.4f}in ({max_deviation / SVG_DPI * AXIDRAW_STEPS_PER_INCH:.1f} steps)")
+
+	return simplified
+
+#--------------------------------------------#
+
+
+
+#--------------------------------------------#
+#----------- STROKE DEDUPLICATION -----------#
+#--------------------------------------------#
+
+def overlapping_pieces(middles, units, half_lengths, pen_width, angle_tolerance, block_size=1 << 16):
+	# pairs (later, earlier) of pieces where the later piece's middle lies on the earlier piece - running the same way
+	# either way round, within half a pen width of its centerline and inside its own length, so a line cut into many
+	# short pieces still only counts once
+	# pieces are bucketed by pen width cell and by direction, in bins at least angle_tolerance wide, and sorted by bucket so
+	# each bucket is a range of one array. overlapping pieces are always in neighboring cells and neighboring direction bins,
+	# and each pair of buckets is only looked up from one side
+	cos_tolerance = math.cos(math.radians(angle_tolerance))
+	bins = int(180 // angle_tolerance) if angle_tolerance > 0 else 180
+	if bins < 3:
+		bins = 1
+	directions = np.minimum((np.arctan2(units[:, 1], units[:, 0]) % np.pi / np.pi * bins).astype(np.int64), bins - 1)
+	cells = np.floor(middles / pen_width).astype(np.int64)
+	cells -= cells.min(axis=0) - 1
+	stride = int(cells[:, 1].max()) + 2
+	cell_keys = cells[:, 0] * stride + cells[:, 1]
+	keys = cell_keys * bins + directions
+	by_key = np.argsort(keys, kind="stable")
+	bucket_keys, bucket_starts, bucket_counts = np.unique(keys[by_key], return_index=True, return_counts=True)
+
+	# (cell offset, direction offset) of the buckets to look in, covering each neighboring pair once
+	neighbors = [(0, 0)] + ([(0, 1)] if bins > 1 else [])
+	for cell_offset in (1, stride - 1, stride, stride + 1):
+		neighbors += [(cell_offset, direction_offset) for direction_offset in ((-1, 0, 1) if bins > 1 else (0,))]
+
+	# middle, direction and half length of each piece in one row, so each candidate is gathered at once
+	pieces = np.column_stack((middles, units, half_lengths))
+
+	later_pieces = []
+	earlier_pieces = []
+	# work through the pieces bucket by bucket, so the lookups below run over sorted keys
+	for first in range(0, len(keys), block_size):
+		block = by_key[first:first + block_size]
+		for cell_offset, direction_offset in neighbors:
+			neighbor_keys = (cell_keys[block] + cell_offset) * bins + (directions[block] + direction_offset) % bins
+			bucket = np.minimum(np.searchsorted(bucket_keys, neighbor_keys), len(bucket_keys) - 1)
+			counts = np.where(bucket_keys[bucket] == neighbor_keys, bucket_counts[bucket], 0)
+			total = int(counts.sum())
+			if total == 0:
+				continue
+			one = np.repeat(block, counts)
+			other = by_key[np.repeat(bucket_starts[bucket] - np.cumsum(counts) + counts, counts) + np.arange(total)]
+			if cell_offset == 0 and direction_offset == 0:
+				# a piece's own bucket holds each pair both ways round
+				one_later = one > other
+				later = one[one_later]
+				earlier = other[one_later]
+			else:
+				later = np.maximum(one, other)
+				earlier = np.minimum(one, other)
+
+			x, y, later_ux, later_uy, _ = pieces[later].T
+			other_x, other_y, ux, uy, half_length = pieces[earlier].T
+			dx = x - other_x
+			dy = y - other_y
+			along = dx * ux + dy * uy
+			overlapping = (
+				(np.abs(later_ux * ux + later_uy * uy) >= cos_tolerance) &
+				(np.abs(dx * uy - dy * ux) <= pen_width / 2) &
+				(-half_length <= along) & (along < half_length)
+			)
+			later_pieces.append(later[overlapping])
+			earlier_pieces.append(earlier[overlapping])
+
+	if not later_pieces:
+		return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+	return np.concatenate(later_pieces), np.concatenate(earlier_pieces)
+
+def deduplicate_paths(paths, pen_width=PEN_WIDTH_INCHES * SVG_DPI, max_overdraws=DEDUP_MAX_OVERDRAWS, angle_tolerance=DEDUP_ANGLE_TOLERANCE, min_gap=DEDUP_MIN_GAP_INCHES * SVG_DPI):
+	# drop the parts of strokes that would redraw a line already drawn more than max_overdraws times
+	# segments are cut into pieces no longer than the pen width, and each piece is compared against the pieces drawn before it
+	if max_overdraws is None or not paths:
+		return paths
+
+	logging.info("Starting stroke deduplication")
+
+	# the segments of every path, leaving out the ones with no length
+	drawn = [index for index, path in enumerate(paths) if len(path) > 1]
+	if not drawn:
+		return []
+	segment_starts = np.concatenate([paths[index][:-1] for index in drawn]).astype(float)
+	segment_ends = np.concatenate([paths[index][1:] for index in drawn]).astype(float)
+	segment_paths = np.repeat(drawn, [len(paths[index]) - 1 for index in drawn])
+	deltas = segment_ends - segment_starts
+	lengths = np.hypot(*deltas.T)
+	has_length = lengths > 0
+	segment_starts, segment_ends, segment_paths, deltas, lengths = segment_starts[has_length], segment_ends[has_length], segment_paths[has_length], deltas[has_length], lengths[has_length]
+	if len(lengths) == 0:
+		return []
+
+	# cut each segment into equal pieces no longer than the pen width
+	pieces = np.ceil(lengths / pen_width).astype(np.int64)
+	piece_segments = np.repeat(np.arange(len(lengths)), pieces)
+	piece_numbers = np.arange(len(piece_segments)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+	piece_counts = pieces[piece_segments]
+	piece_starts = segment_starts[piece_segments] + (piece_numbers / piece_counts)[:, None] * deltas[piece_segments]
+	piece_ends = segment_starts[piece_segments] + ((piece_numbers + 1) / piece_counts)[:, None] * deltas[piece_segments]
+	segment_last = piece_numbers == piece_counts - 1
+	piece_ends[segment_last] = segment_ends[piece_segments[segment_last]]
+	half_lengths = (lengths / pieces / 2)[piece_segments]
+	units = (deltas / lengths[:, None])[piece_segments]
+	piece_paths = segment_paths[piece_segments]
+
+	# count the earlier pieces under each piece - a piece is dropped when more than max_overdraws of them are still drawn,
+	# which only needs working through in order for the pieces with more than max_overdraws of them to begin with
+	later, earlier = overlapping_pieces((piece_starts + piece_ends) / 2, units, half_lengths, pen_width, angle_tolerance)
+	counts = np.bincount(later, minlength=len(piece_segments))
+	keep = np.ones(len(piece_segments), dtype=bool)
+	undecided = np.flatnonzero(counts > max_overdraws)
+	if len(undecided):
+		by_later = np.argsort(later, kind="stable")
+		earlier = earlier[by_later].tolist()
+		offsets = (np.cumsum(counts) - counts).tolist()
+		counts = counts.tolist()
+		kept = keep.tolist()
+		for piece in undecided.tolist():
+			offset = offsets[piece]
+			kept[piece] = sum(map(kept.__getitem__, earlier[offset:offset + counts[piece]])) <= max_overdraws
+		keep = np.array(kept, dtype=bool)
+
+	# gaps shorter than min_gap in the middle of a path are drawn anyway, as lifting the pen over them costs more than redrawing them
+	path_first = np.r_[True, piece_paths[1:] != piece_paths[:-1]]
+	path_last = np.r_[piece_paths[1:] != piece_paths[:-1], True]
+	dropped = ~keep
+	if dropped.any():
+		gap_start = dropped & (path_first | np.r_[True, keep[:-1]])
+		gap_end = dropped & (path_last | np.r_[keep[1:], True])
+		gaps = np.cumsum(gap_start)[dropped] - 1
+		gap_lengths = np.bincount(gaps, weights=2 * half_lengths[dropped])
+		interior = ~path_first[gap_start] & ~path_last[gap_end]
+		keep[np.flatnonzero(dropped)[(interior & (gap_lengths < min_gap))[gaps]]] = True
+
+	# start a new path wherever the kept pieces are broken by a dropped one or a different path,
+	# with a vertex at the start of each run, at the end of each segment and where each run ends
+	run_start = keep & (path_first | ~np.r_[True, keep[:-1]])
+	run_end = keep & (path_last | ~np.r_[keep[1:], True])
+	vertex_mask = np.stack((run_start, segment_last | run_end), axis=1) & keep[:, None]
+	vertices = np.stack((piece_starts, piece_ends), axis=1)[vertex_mask]
+	new_path = np.stack((run_start, np.zeros_like(run_start)), axis=1)[vertex_mask]
+	deduplicated = np.split(vertices, np.flatnonzero(new_path)[1:]) if len(vertices) else []
+
+	removed_distance = float(2 * half_lengths[~keep].sum())
+
+	logging.info(f"Paths: {len(paths)} -> {len(deduplicated)}")
+	logging.info(f"Removed pen-down distance: {removed_distance / SVG_DPI:.2f}in")
+
+	return deduplicated
+
+#--------------------------------------------#
+
+
+
+#--------------------------------------------#
+#------------- PATH OPTIMIZATION ------------#
+#--------------------------------------------#
+
+def distance(a, b):
+	return math.hypot(b[0] - a[0], b[1] - a[1])
+
+def pendown_distance(paths):
+	# travel with the pen lowered
+	return float(sum(np.hypot(*np.diff(path, axis=0).T).sum() for path in paths))
+
+def penup_distance(paths, origin=(0, 0)):
+	# travel with the pen raised, starting and ending at the home position
+	if not paths:
+		return 0
+	starts = np.array([path[0] for path in paths] + [origin], dtype=float)
+	ends = np.array([origin] + [path[-1] for path in paths], dtype=float)
+	return float(np.hypot(*(starts - ends).T).sum())
+
+def order_paths(starts, ends, origin=(0, 0)):
+	# greedy nearest neighbor - always travel to the closest unvisited path end, reversing the path if its end is closer than its start
+	order = [] # list of (path index, reversed)
+	visited = np.zeros(len(starts), dtype=bool)
+	position = np.asarray(origin, dtype=float)
+	for _ in range(len(starts)):
+		start_distances = np.hypot(*(starts - position).T)
+		end_distances = np.hypot(*(ends - position).T)
+		start_distances[visited] = np.inf
+		end_distances[visited] = np.inf
+		start_index = int(np.argmin(start_distances))
+		end_index = int(np.argmin(end_distances))
+		if end_distances[end_index] < start_distances[start_index]:
+			order.append((end_index, True))
+			position = starts[end_index]
+		else:
+			order.append((start_index, False))
+			position = ends[start_index]
+		visited[order[-1][0]] = True
+	return order
+
+def refine_order(starts, ends, order, origin=(0, 0), time_limit=PATH_OPTIMIZE_TIME_LIMIT):
+	# 2-opt - reversing a run of the order (and flipping each path in it) only changes the two pen-up moves at its ends
+	# for each i the change is worked out for every j at once, and the best reversal is made until none of them helps
+	if len(order) < 2:
+		return order
+
+	indices = np.array([index for index, _ in order])
+	flipped = np.array([reverse for _, reverse in order], dtype=bool)
+	path_starts = np.where(flipped[:, None], ends[indices], starts[indices])	# where the path at each position starts drawing
+	path_ends = np.where(flipped[:, None], starts[indices], ends[indices])		# and where it stops
+	origin = np.asarray(origin, dtype=float)
+
+	deadline = time.monotonic() + time_limit
+	improved = True
+	while improved:
+		improved = False
+		for i in range(len(order)):
+			while True:
+				previous = path_ends[i - 1] if i > 0 else origin
+				following = np.vstack((path_starts[i + 1:], origin))
+				delta = np.hypot(*(path_ends[i:] - previous).T) + np.hypot(*(following - path_starts[i]).T) - math.hypot(*(path_starts[i] - previous)) - np.hypot(*(following - path_ends[i:]).T)
+				j = int(np.argmin(delta))
+				if delta[j] >= -1e-9:
+					break
+				j += i
+				path_starts[i:j + 1], path_ends[i:j + 1] = path_ends[i:j + 1][::-1].copy(), path_starts[i:j + 1][::-1].copy()
+				indices[i:j + 1] = indices[i:j + 1][::-1].copy()
+				flipped[i:j + 1] = ~flipped[i:j + 1][::-1]
+				improved = True
+			if time.monotonic() >= deadline:
+				logging.info("Path optimization time limit reached")
+				improved = False
+				break
+	return list(zip(indices.tolist(), flipped.tolist()))
+
+def join_paths(paths, tolerance=PATH_JOIN_TOLERANCE_PIXELS):
+	# merge consecutive paths whose endpoints touch so the pen stays down between them
+	joined = []
+	for path in paths:
+		if joined and distance(joined[-1][-1], path[0]) <= tolerance:
+			joined[-1] = np.concatenate((joined[-1], path[1:] if np.array_equal(joined[-1][-1], path[0]) else path))
+		else:
+			joined.append(path)
+	return joined
+
+def optimize_paths(paths):
+	if not PATH_OPTIMIZE or not paths:
+		return paths
+
+	logging.info("Starting path optimization")
+
+	penup_before = penup_distance(paths)
+
+	starts = np.array([path[0] for path in paths], dtype=float)
+	ends = np.array([path[-1] for path in paths], dtype=float)
+	order = order_paths(starts, ends)
+	order = refine_order(starts, ends, order)
+	optimized = join_paths([paths[index][::-1] if reverse else paths[index] for index, reverse in order])
+
+	penup_after = penup_distance(optimized)
+
+	logging.info(f"Paths: {len(paths)} -> {len(optimized)}")
+	logging.info(f"Pen-up distance: {penup_before / SVG_DPI:.2f}in -> {penup_after / SVG_DPI:.2f}in")
+
+	return optimized
+
+#--------------------------------------------#
+
+
+
+#--------------------------------------------#
+#--------------- SVG CREATION ---------------#
+#--------------------------------------------#
+
+from functools import lru_cache
+from itertools import chain
+from operator import itemgetter
+
+# https://regex101.com/ - (?<!id=")(?<=d=")[^"]*
+TEXTS = [
+	{
+		"title": "FIRE PREVENTION",
+		"rotate": "0",
+		"scale": 5,
+		"translate": [-1.7989377289377326, 4.077399267399268],
+		"paths": ["M -42.998 -3.50094 L -42.998 3.50521 M -42.998 -3.50094 L -38.6588 -3.50094 M -42.998 -0.15661 L -40.331 -0.15661","M -36.9972 -3.50094 L -36.9972 3.50521","M -34.3302 -3.50094 L -34.3302 3.50521 M -34.3302 -3.50094 L -31.3246 -3.50094 L -30.3298 -3.16227 L -29.9911 -2.8236 L -29.6524 -2.16744 L -29.6524 -1.49011 L -29.9911 -0.83394 L -30.3298 -0.49528 L -31.3246 -0.15661 L -34.3302 -0.15661 M -31.9913 -0.15661 L -29.6524 3.50521","M -27.3241 -3.50094 L -27.3241 3.50521 M -27.3241 -3.50094 L -22.9849 -3.50094 M -27.3241 -0.15661 L -24.6571 -0.15661 M -27.3241 3.50521 L -22.9849 3.50521","M -16.9948 -3.50094 L -16.9948 3.50521 M -16.9948 -3.50094 L -13.9891 -3.50094 L -12.9943 -3.16227 L -12.6556 -2.8236 L -12.317 -2.16744 L -12.317 -1.16203 L -12.6556 -0.49528 L -12.9943 -0.15661 L -13.9891 0.17147 L -16.9948 0.17147","M -9.9887 -3.50094 L -9.9887 3.50521 M -9.9887 -3.50094 L -6.983 -3.50094 L -5.9882 -3.16227 L -5.6495 -2.8236 L -5.3109 -2.16744 L -5.3109 -1.49011 L -5.6495 -0.83394 L -5.9882 -0.49528 L -6.983 -0.15661 L -9.9887 -0.15661 M -7.6498 -0.15661 L -5.3109 3.50521","M -2.9825 -3.50094 L -2.9825 3.50521 M -2.9825 -3.50094 L 1.3567 -3.50094 M -2.9825 -0.15661 L -0.3155 -0.15661 M -2.9825 3.50521 L 1.3567 3.50521","M 2.3515 -3.50094 L 5.0185 3.50521 M 7.6855 -3.50094 L 5.0185 3.50521","M 9.347 -3.50094 L 9.347 3.50521 M 9.347 -3.50094 L 13.6862 -3.50094 M 9.347 -0.15661 L 12.014 -0.15661 M 9.347 3.50521 L 13.6862 3.50521","M 15.6758 -3.50094 L 15.6758 3.50521 M 15.6758 -3.50094 L 20.3536 3.50521 M 20.3536 -3.50094 L 20.3536 3.50521","M 24.3435 -3.50094 L 24.3435 3.50521 M 22.0152 -3.50094 L 26.6824 -3.50094","M 28.344 -3.50094 L 28.344 3.50521","M 32.6832 -3.50094 L 32.0164 -3.16227 L 31.3497 -2.49552 L 31.011 -1.82877 L 30.6829 -0.83394 L 30.6829 0.83822 L 31.011 1.83305 L 31.3497 2.50509 L 32.0164 3.17184 L 32.6832 3.50521 L 34.0167 3.50521 L 34.6834 3.17184 L 35.3502 2.50509 L 35.6888 1.83305 L 36.0169 0.83822 L 36.0169 -0.83394 L 35.6888 -1.82877 L 35.3502 -2.49552 L 34.6834 -3.16227 L 34.0167 -3.50094 Z","M 38.3452 -3.50094 L 38.3452 3.50521 M 38.3452 -3.50094 L 43.023 3.50521 M 43.023 -3.50094 L 43.023 3.50521"]
+	},
+	{
+		"title": "PACK/UNPACK",
+		"rotate": "0",
+		"scale": 5,
+		"translate": [-3.028529411764706, 7.079705882352942],
+		"paths": ["M -36.8512 -3.99623 L -36.8512 3.00991 M -36.8512 -3.99623 L -33.8455 -3.99623 L -32.8507 -3.65757 L -32.512 -3.3189 L -32.1734 -2.66274 L -32.1734 -1.65733 L -32.512 -0.99058 L -32.8507 -0.65191 L -33.8455 -0.32383 L -36.8512 -0.32383","M -28.1729 -3.99623 L -30.8399 3.00991 M -28.1729 -3.99623 L -25.5059 3.00991 M -29.845 0.68158 L -26.5007 0.68158","M -19.1665 -2.32407 L -19.5051 -2.99082 L -20.1719 -3.65757 L -20.8386 -3.99623 L -22.1721 -3.99623 L -22.8389 -3.65757 L -23.5056 -2.99082 L -23.8443 -2.32407 L -24.1724 -1.32924 L -24.1724 0.34292 L -23.8443 1.33775 L -23.5056 2.00979 L -22.8389 2.67654 L -22.1721 3.00991 L -20.8386 3.00991 L -20.1719 2.67654 L -19.5051 2.00979 L -19.1665 1.33775","M -16.8382 -3.99623 L -16.8382 3.00991 M -12.1604 -3.99623 L -16.8382 0.68158 M -15.166 -0.99058 L -12.1604 3.00991","M -4.498 -5.32973 L -10.4881 5.33821","M -2.4978 -3.99623 L -2.4978 1.00967 L -2.1591 2.00979 L -1.4924 2.67654 L -0.4869 3.00991 L 0.1692 3.00991 L 1.1746 2.67654 L 1.8414 2.00979 L 2.18 1.00967 L 2.18 -3.99623","M 4.8364 -3.99623 L 4.8364 3.00991 M 4.8364 -3.99623 L 9.5142 3.00991 M 9.5142 -3.99623 L 9.5142 3.00991","M 12.1706 -3.99623 L 12.1706 3.00991 M 12.1706 -3.99623 L 15.1763 -3.99623 L 16.1711 -3.65757 L 16.5098 -3.3189 L 16.8484 -2.66274 L 16.8484 -1.65733 L 16.5098 -0.99058 L 16.1711 -0.65191 L 15.1763 -0.32383 L 12.1706 -0.32383","M 20.849 -3.99623 L 18.182 3.00991 M 20.849 -3.99623 L 23.516 3.00991 M 19.1768 0.68158 L 22.5211 0.68158","M 29.8553 -2.32407 L 29.5167 -2.99082 L 28.8499 -3.65757 L 28.1832 -3.99623 L 26.8497 -3.99623 L 26.1829 -3.65757 L 25.5162 -2.99082 L 25.1775 -2.32407 L 24.8494 -1.32924 L 24.8494 0.34292 L 25.1775 1.33775 L 25.5162 2.00979 L 26.1829 2.67654 L 26.8497 3.00991 L 28.1832 3.00991 L 28.8499 2.67654 L 29.5167 2.00979 L 29.8553 1.33775","M 32.1837 -3.99623 L 32.1837 3.00991 M 36.8615 -3.99623 L 32.1837 0.68158 M 33.8559 -0.99058 L 36.8615 3.00991"]
+	},
+	{
+		"title": "MONOLITH",
+		"rotate": "0",
+		"scale": 5,
+		"translate": [-0.4233333333333331, 6.523589743589747],
+		"paths": ["M -24.1766 -3.50094 L -24.1766 3.50521 M -24.1766 -3.50094 L -21.5096 3.50521 M -18.8426 -3.50094 L -21.5096 3.50521 M -18.8426 -3.50094 L -18.8426 3.50521","M -14.5034 -3.50094 L -15.1702 -3.16227 L -15.8369 -2.49552 L -16.1756 -1.82877 L -16.5037 -0.83394 L -16.5037 0.83822 L -16.1756 1.83305 L -15.8369 2.50509 L -15.1702 3.17184 L -14.5034 3.50521 L -13.1699 3.50521 L -12.5032 3.17184 L -11.8365 2.50509 L -11.4978 1.83305 L -11.1697 0.83822 L -11.1697 -0.83394 L -11.4978 -1.82877 L -11.8365 -2.49552 L -12.5032 -3.16227 L -13.1699 -3.50094 Z","M -8.8414 -3.50094 L -8.8414 3.50521 M -8.8414 -3.50094 L -4.1636 3.50521 M -4.1636 -3.50094 L -4.1636 3.50521","M 0.165 -3.50094 L -0.5018 -3.16227 L -1.1685 -2.49552 L -1.5072 -1.82877 L -1.8353 -0.83394 L -1.8353 0.83822 L -1.5072 1.83305 L -1.1685 2.50509 L -0.5018 3.17184 L 0.165 3.50521 L 1.4985 3.50521 L 2.1652 3.17184 L 2.832 2.50509 L 3.1706 1.83305 L 3.4987 0.83822 L 3.4987 -0.83394 L 3.1706 -1.82877 L 2.832 -2.49552 L 2.1652 -3.16227 L 1.4985 -3.50094 Z","M 5.8271 -3.50094 L 5.8271 3.50521 M 5.8271 3.50521 L 9.8276 3.50521","M 11.4997 -3.50094 L 11.4997 3.50521","M 15.5002 -3.50094 L 15.5002 3.50521 M 13.1719 -3.50094 L 17.8391 -3.50094","M 19.5007 -3.50094 L 19.5007 3.50521 M 24.1785 -3.50094 L 24.1785 3.50521 M 19.5007 -0.15661 L 24.1785 -0.15661"]
+	},
+	{
+		"title": "HOUSE FIRE",
+		"rotate": "0",
+		"scale": 5,
+		"translate": [-3.882564102564104, 10.501025641025636],
+		"paths": ["M -29.5106 -3.50094 L -29.5106 3.50521 M -24.8328 -3.50094 L -24.8328 3.50521 M -29.5106 -0.15661 L -24.8328 -0.15661","M -20.5042 -3.50094 L -21.1709 -3.16227 L -21.8377 -2.49552 L -22.1763 -1.82877 L -22.5044 -0.83394 L -22.5044 0.83822 L -22.1763 1.83305 L -21.8377 2.50509 L -21.1709 3.17184 L -20.5042 3.50521 L -19.1707 3.50521 L -18.5039 3.17184 L -17.8372 2.50509 L -17.4985 1.83305 L -17.1704 0.83822 L -17.1704 -0.83394 L -17.4985 -1.82877 L -17.8372 -2.49552 L -18.5039 -3.16227 L -19.1707 -3.50094 Z","M -14.8421 -3.50094 L -14.8421 1.50497 L -14.5034 2.50509 L -13.8367 3.17184 L -12.8312 3.50521 L -12.1751 3.50521 L -11.1697 3.17184 L -10.5029 2.50509 L -10.1643 1.50497 L -10.1643 -3.50094","M -3.1687 -2.49552 L -3.8355 -3.16227 L -4.8409 -3.50094 L -6.1744 -3.50094 L -7.1692 -3.16227 L -7.836 -2.49552 L -7.836 -1.82877 L -7.5079 -1.16203 L -7.1692 -0.83394 L -6.5025 -0.49528 L -4.5022 0.17147 L -3.8355 0.49955 L -3.5074 0.83822 L -3.1687 1.50497 L -3.1687 2.50509 L -3.8355 3.17184 L -4.8409 3.50521 L -6.1744 3.50521 L -7.1692 3.17184 L -7.836 2.50509","M -0.8404 -3.50094 L -0.8404 3.50521 M -0.8404 -3.50094 L 3.4988 -3.50094 M -0.8404 -0.15661 L 1.8266 -0.15661 M -0.8404 3.50521 L 3.4988 3.50521","M 9.4889 -3.50094 L 9.4889 3.50521 M 9.4889 -3.50094 L 13.8281 -3.50094 M 9.4889 -0.15661 L 12.1559 -0.15661","M 15.4896 -3.50094 L 15.4896 3.50521","M 18.1566 -3.50094 L 18.1566 3.50521 M 18.1566 -3.50094 L 21.1623 -3.50094 L 22.1571 -3.16227 L 22.4958 -2.8236 L 22.8344 -2.16744 L 22.8344 -1.49011 L 22.4958 -0.83394 L 22.1571 -0.49528 L 21.1623 -0.15661 L 18.1566 -0.15661 M 20.4955 -0.15661 L 22.8344 3.50521","M 25.1627 -3.50094 L 25.1627 3.50521 M 25.1627 -3.50094 L 29.5019 -3.50094 M 25.1627 -0.15661 L 27.8297 -0.15661 M 25.1627 3.50521 L 29.5019 3.50521"]
+	},
+	{
+		"title": "MONTANA",
+		"rotate": "0",
+		"scale": 5,
+		"translate": [-1.6519999999999988, 11.513499999999993],
+		"paths": ["M -22.8304 -3.50094 L -22.8304 3.50521 M -22.8304 -3.50093 L -20.1634 3.50521 M -17.4964 -3.50094 L -20.1634 3.50521 M -17.4964 -3.50094 L -17.4964 3.50521","M -13.1572 -3.50094 L -13.824 -3.16227 L -14.4907 -2.49552 L -14.8294 -1.82877 L -15.1575 -0.83394 L -15.1575 0.83822 L -14.8294 1.83305 L -14.4907 2.50509 L -13.824 3.17184 L -13.1572 3.50521 L -11.8237 3.50521 L -11.157 3.17184 L -10.4903 2.50509 L -10.1516 1.83305 L -9.8235 0.83822 L -9.8235 -0.83394 L -10.1516 -1.82877 L -10.4903 -2.49552 L -11.157 -3.16227 L -11.8237 -3.50094 Z","M -7.4952 -3.50094 L -7.4952 3.50521 M -7.4952 -3.50093 L -2.8174 3.50521 M -2.8174 -3.50093 L -2.8174 3.50521","M 1.1725 -3.50094 L 1.1725 3.50521 M -1.1558 -3.50094 L 3.5114 -3.50094","M 6.8452 -3.50094 L 4.1782 3.50521 M 6.8452 -3.50093 L 9.5122 3.50521 M 5.173 1.17688 L 8.5173 1.17688","M 11.1737 -3.50094 L 11.1737 3.50521 M 11.1737 -3.50093 L 15.8515 3.50521 M 15.8515 -3.50093 L 15.8515 3.50521","M 20.1802 -3.50094 L 17.5132 3.50521 M 20.1802 -3.50093 L 22.8472 3.50521 M 18.508 1.17688 L 21.8523 1.17688"]
+	},
+	{
+		"title": "ABANDONED",
+		"rotate": "0",
+		"scale": 5,
+		"translate": [-2.1572946429, 9.2146339286],
+		"paths": ["M -27.3515 -3.50094 L -30.0185 3.50521 M -27.3515 -3.50094 L -24.6845 3.50521 M -29.0237 1.17688 L -25.6793 1.17688","M -23.0229 -3.50094 L -23.0229 3.50521 M -23.0229 -3.50093 L -20.0173 -3.50093 L -19.0225 -3.16227 L -18.6838 -2.8236 L -18.3451 -2.16744 L -18.3451 -1.49011 L -18.6838 -0.83394 L -19.0225 -0.49528 L -20.0173 -0.15661 M -23.0229 -0.15661 L -20.0173 -0.15661 L -19.0225 0.17147 L -18.6838 0.49955 L -18.3451 1.17688 L -18.3451 2.17171 L -18.6838 2.83846 L -19.0225 3.17184 L -20.0173 3.50521 L -23.0229 3.50521","M -14.3446 -3.50094 L -17.0116 3.50521 M -14.3446 -3.50093 L -11.6776 3.50521 M -16.0168 1.17688 L -12.6725 1.17688","M -10.0161 -3.50094 L -10.0161 3.50521 M -10.0161 -3.50093 L -5.3383 3.50521 M -5.3383 -3.50093 L -5.3383 3.50521","M -2.6819 -3.50094 L -2.6819 3.50521 M -2.6819 -3.50093 L -0.343 -3.50093 L 0.6624 -3.16227 L 1.3186 -2.49552 L 1.6573 -1.82877 L 1.9959 -0.83394 L 1.9959 0.83822 L 1.6573 1.83305 L 1.3186 2.50509 L 0.6624 3.17184 L -0.343 3.50521 L -2.6819 3.50521","M 5.9965 -3.50094 L 5.3297 -3.16227 L 4.663 -2.49552 L 4.3243 -1.82877 L 3.9962 -0.83394 L 3.9962 0.83822 L 4.3243 1.83305 L 4.663 2.50509 L 5.3297 3.17184 L 5.9965 3.50521 L 7.33 3.50521 L 7.9967 3.17184 L 8.6635 2.50509 L 9.0021 1.83305 L 9.3302 0.83822 L 9.3302 -0.83394 L 9.0021 -1.82877 L 8.6635 -2.49552 L 7.9967 -3.16227 L 7.33 -3.50094 Z","M 11.6585 -3.50094 L 11.6585 3.50521 M 11.6585 -3.50093 L 16.3363 3.50521 M 16.3363 -3.50093 L 16.3363 3.50521","M 18.9927 -3.50094 L 18.9927 3.50521 M 18.9927 -3.50093 L 23.3319 -3.50093 M 18.9927 -0.15661 L 21.6597 -0.15661 M 18.9927 3.50521 L 23.3319 3.50521","M 25.3215 -3.50094 L 25.3215 3.50521 M 25.3215 -3.50093 L 27.6604 -3.50093 L 28.6658 -3.16227 L 29.322 -2.49552 L 29.6607 -1.82877 L 29.9993 -0.83394 L 29.9993 0.83822 L 29.6607 1.83305 L 29.322 2.50509 L 28.6658 3.17184 L 27.6604 3.50521 L 25.3215 3.50521"]
+
+	}
+]
+
+def mapRange(t, inMin, inMax, outMin, outMax):
+	return (t - inMin) / (inMax - inMin) * (outMax - outMin) + outMin;
+
+def parse_path(path_string):
+	# split path data made of M, L and Z commands into polylines
+	polylines = []
+	polyline = []
+	tokens = path_string.replace(",", " ").split()
+	index = 0
+	while index < len(tokens):
+		command = tokens[index]
+		if command == "M":
+			if len(polyline) > 1:
+				polylines.append(polyline)
+			polyline = [(float(tokens[index + 1]), float(tokens[index + 2]))]
+			index += 3
+		elif command == "L":
+			polyline.append((float(tokens[index + 1]), float(tokens[index + 2])))
+			index += 3
+		elif command == "Z":
+			polyline.append(polyline[0])
+			index += 1
+		else:
+			raise ValueError(f"Unsupported path command {command!r}")
+	if len(polyline) > 1:
+		polylines.append(polyline)
+	return [np.array(polyline) for polyline in polylines]
+
+@lru_cache(maxsize=None)
+def parse_glyphs():
+	# the TEXTS path strings parsed once into arrays, still in glyph units
+	return [[polyline for path in text["paths"] for polyline in parse_path(path)] for text in TEXTS]
+
+@lru_cache(maxsize=None)
+def compile_texts(layout):
+	# bake each title's translate/rotate/scale and its placement in the bounding box into absolute svg pixels
+	xMin, yMin, width, height = layout
+	paths = []
+	for text, glyphs in zip(TEXTS, parse_glyphs()):
+		xTranslate = mapRange(text["translate"][0], X_DATA_IN_MIN, X_DATA_IN_MAX, xMin, xMin + width)
+		yTranslate = mapRange(text["translate"][1], Y_DATA_IN_MIN, Y_DATA_IN_MAX, yMin, yMin + height)
+		angle = math.radians(float(text["rotate"]))
+		matrix = text["scale"] * np.array([[math.cos(angle), -math.sin(angle)], [math.sin(angle), math.cos(angle)]])
+		for glyph in glyphs:
+			paths.append(glyph @ matrix.T + (xTranslate, yTranslate))
+	return paths
+
+def get_text_paths(boundingBox):
+	return list(compile_texts((boundingBox['x'], boundingBox['y'], boundingBox['w'], boundingBox['h'])))
+
+def get_bounding_box():
+
+	# calculate the aspect ratios
+	in_aspect_ratio = (X_DATA_IN_MAX - X_DATA_IN_MIN) / (Y_DATA_IN_MAX - Y_DATA_IN_MIN)
+	out_aspect_ratio = (SVG_WIDTH_INCHES - 2 * SVG_PADDING_INCHES) / (SVG_HEIGHT_INCHES - 2 * SVG_PADDING_INCHES)
+
+	# calculate the bounding box
+	boundingBox = {'x': 0, 'y': 0, 'w': 0, 'h': 0}
+	if in_aspect_ratio < out_aspect_ratio:
+		boundingBox['y'] = SVG_PADDING_INCHES * SVG_DPI
+		boundingBox['h'] = SVG_HEIGHT_PIXELS - 2 * boundingBox['y']
+		boundingBox['x'] = 0.5 * (SVG_WIDTH_PIXELS - in_aspect_ratio * (SVG_HEIGHT_PIXELS - 2 * SVG_PADDING_INCHES * SVG_DPI))
+		boundingBox['w'] = SVG_WIDTH_PIXELS - 2 * boundingBox['x']
+	else:
+		boundingBox['x'] = SVG_PADDING_INCHES * SVG_DPI
+		boundingBox['w'] = SVG_WIDTH_PIXELS - 2 * boundingBox['x']
+		boundingBox['y'] = 0.5 * (SVG_HEIGHT_PIXELS - 1 / in_aspect_ratio * (SVG_WIDTH_PIXELS - 2 * SVG_PADDING_INCHES * SVG_DPI))
+		boundingBox['h'] = SVG_HEIGHT_PIXELS - 2 * boundingBox['y']
+
+	return boundingBox
+
+def map_positions(positions, boundingBox):
+	# map a document's whole "pos" array into svg pixels at once
+	points = np.array(list(map(itemgetter("x", "y"), positions)), dtype=float).reshape(-1, 2)
+	points[:, 0] = mapRange(points[:, 0], X_DATA_IN_MIN, X_DATA_IN_MAX, boundingBox['x'] + boundingBox['w'], boundingBox['x'])
+	points[:, 1] = mapRange(points[:, 1], Y_DATA_IN_MIN, Y_DATA_IN_MAX, boundingBox['y'], boundingBox['y'] + boundingBox['h'])
+	return points
+
+def clip_polyline(points, boundingBox, segment_mask=None):
+	# liang-barsky clipping of every segment against the bounding box - https://en.wikipedia.org/wiki/Liang%E2%80%93Barsky_algorithm
+	# segment_mask can disable segments, e.g. the jumps between concatenated documents
+	if len(points) < 2:
+		return []
+
+	origins = points[:-1]
+	deltas = points[1:] - points[:-1]
+
+	# parametric entry and exit of each segment
+	t0 = np.zeros(len(deltas))
+	t1 = np.ones(len(deltas))
+	visible = np.ones(len(deltas), dtype=bool) if segment_mask is None else segment_mask.copy()
+	edges = [
+		(-deltas[:, 0], origins[:, 0] - boundingBox['x']),
+		(deltas[:, 0], boundingBox['x'] + boundingBox['w'] - origins[:, 0]),
+		(-deltas[:, 1], origins[:, 1] - boundingBox['y']),
+		(deltas[:, 1], boundingBox['y'] + boundingBox['h'] - origins[:, 1])
+	]
+	with np.errstate(divide="ignore", invalid="ignore"):
+		for p, q in edges:
+			visible &= ~((p == 0) & (q < 0))
+			ratio = q / p
+			t0 = np.where(p < 0, np.maximum(t0, ratio), t0)
+			t1 = np.where(p > 0, np.minimum(t1, ratio), t1)
+	visible &= t0 <= t1
+
+	visible_indices = np.flatnonzero(visible)
+	if len(visible_indices) == 0:
+		return []
+
+	starts = origins + t0[:, None] * deltas
+	ends = origins + t1[:, None] * deltas
+
+	# consecutive visible segments stay in one polyline unless one of them was cut at the boundary
+	connected = (np.diff(visible_indices) == 1) & (t1[visible_indices[:-1]] == 1) & (t0[visible_indices[1:]] == 0)
+	runs = np.split(visible_indices, np.flatnonzero(~connected) + 1)
+
+	polylines = []
+	for run in runs:
+		polyline = np.vstack((starts[run[0]], ends[run]))
+		if np.any(polyline != polyline[0]):
+			polylines.append(polyline)
+	return polylines
+
+def map_documents(data, boundingBox):
+	# map and clip all documents in one batch, masking out the segments that would join one document to the next
+	lengths = np.array([len(document["pos"]) for document in data], dtype=int)
+	points = map_positions(chain.from_iterable(document["pos"] for document in data), boundingBox)
+	segment_mask = np.ones(max(len(points) - 1, 0), dtype=bool)
+	boundaries = np.cumsum(lengths)[:-1]
+	segment_mask[boundaries[(boundaries > 0) & (boundaries < len(points))] - 1] = False
+	return clip_polyline(points, boundingBox, segment_mask)
+
+def build_paths(data):
+	boundingBox = get_bounding_box()
+
+	# map the documents into the bounding box, clipping at its edges
+	with timed_stage("mapping", documents=len(data)) as timing:
+		paths = map_documents(data, boundingBox)
+		timing.update(paths=len(paths), vertices=sum(len(path) for path in paths))
+
+	# debug - draw bounds
+	# xMin = boundingBox["x"]
+	# xMax = boundingBox["x"] + boundingBox["w"]
+	# yMin = boundingBox["y"]
+	# yMax = boundingBox["y"] + boundingBox["h"]
+	# paths.append(np.array([[xMin, yMin], [xMax, yMin], [xMax, yMax], [xMin, yMax], [xMin, yMin]]))
+
+	# drop vertices the plotter can't resolve
+	with timed_stage("simplify") as timing:
+		paths = simplify_paths(paths)
+		timing["vertices"] = sum(len(path) for path in paths)
+
+	# trim strokes that redraw the same line over and over
+	with timed_stage("deduplicate") as timing:
+		pendown_before = pendown_distance(paths)
+		paths = deduplicate_paths(paths)
+		timing.update(paths=len(paths), removed_distance_inches=(pendown_before - pendown_distance(paths)) / SVG_DPI)
+
+	# add the titles, precompiled into svg pixels
+	if SVG_DRAW_TITLES:
+		paths.extend(get_text_paths(boundingBox))
+
+	# reorder the paths to reduce pen-up travel
+	with timed_stage("optimize") as timing:
+		paths = optimize_paths(paths)
+		timing.update(paths=len(paths), pendown_distance_inches=pendown_distance(paths) / SVG_DPI, penup_distance_inches=penup_distance(paths) / SVG_DPI)
+
+	return paths
+
+def format_values(values, precision):
+	# shortest decimal form of already rounded values, e.g. 12.5 rather than 12.50 and 3 rather than 3.0
+	if precision <= 0:
+		return [str(value) for value in values.astype(np.int64).tolist()]
+	return [str(value).removesuffix(".0") for value in (values + 0.0).tolist()]
+
+def path_data(paths, precision=SVG_PRECISION, relative=SVG_RELATIVE_PATHS):
+	# path data for several strokes as subpaths of one <path> element
+	scale = 10 ** precision
+	commands = []
+	previous = None
+	for path in paths:
+
+		# snap to the output grid and drop points that land on top of each other
+		grid = np.round(np.asarray(path) * scale).astype(np.int64)
+		grid = grid[np.concatenate(([True], np.any(grid[1:] != grid[:-1], axis=1)))]
+		if len(grid) < 2:
+			continue
+
+		if relative:
+			# deltas are taken on the rounded grid so rounding errors never accumulate
+			deltas = np.diff(grid, axis=0)
+			move = grid[0] if previous is None else grid[0] - previous
+			values = format_values(np.concatenate((move[None], deltas)).ravel() / scale, precision)
+			commands.append(("M" if previous is None else "m") + " ".join(values[:2]) + "l" + " ".join(values[2:]))
+		else:
+			values = format_values(grid.ravel() / scale, precision)
+			commands.append("M" + " ".join(values[:2]) + "L" + " ".join(values[2:]))
+
+		previous = grid[-1]
+
+	return "".join(commands)
+
+def write_svg(filename, paths):
+	# stream the paths straight to disk, then move the file into place so readers never see a partial svg
+	temporary_filename = f"{filename}.tmp"
+	subpaths = SVG_SUBPATHS_PER_PATH if SVG_SUBPATHS_PER_PATH > 0 else max(len(paths), 1)
+	os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+
+	with timed_stage("svg_write", paths=len(paths)) as timing, open(temporary_filename, "w", encoding="utf-8") as file:
+		file.write('<?xml version="1.0" encoding="utf-8" ?>\n')
+		file.write(f'<svg xmlns="http://www.w3.org/2000/svg" version="1.1" width="{SVG_WIDTH_INCHES}in" height="{SVG_HEIGHT_INCHES}in" viewBox="0 0 {SVG_WIDTH_PIXELS} {SVG_HEIGHT_PIXELS}">\n')
+		file.write('<g fill="none" stroke="#000" stroke-width="1">\n')
+		for index in range(0, len(paths), subpaths):
+			data = path_data(paths[index:index + subpaths])
+			if data:
+				file.write(f'<path d="{data}"/>\n')
+		file.write('</g>\n</svg>\n')
+		timing["svg_bytes"] = file.tell()
+
+	os.replace(temporary_filename, filename)
+
+	return filename
+
+def create_svg(log_timestamp, data):
+	logging.info("Starting SVG creation")
+
+	paths = build_paths(data)
+
+	# save the svg
+	filename = write_svg(f"{DIRECTORY_PATH}/outputs/{log_timestamp}_output.svg", paths)
+
+	logging.info(f"SVG saved to {filename} ({os.path.getsize(filename)} bytes)")
+
+	return filename
+
+#--------------------------------------------#
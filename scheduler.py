@@ -0,0 +1,355 @@
+#--------------------------------------------#
+#------------- PLOT CHECKPOINTS -------------#
+#--------------------------------------------#
+
+import os
+import json
+import time
+import hashlib
+import logging
+import numpy as np
+
+from config import *
+
+def file_hash(filename):
+	sha256 = hashlib.sha256()
+	with open(filename, "rb") as file:
+		for block in iter(lambda: file.read(1 << 16), b""):
+			sha256.update(block)
+	return sha256.hexdigest()
+
+def write_atomically(filename, write):
+	# write to a temporary file, flush it to disk, then rename it over the old file - after a power cut either the old or the new file is there, never half of one
+	os.makedirs(os.path.dirname(filename), exist_ok=True)
+	temporary_filename = f"{filename}.tmp"
+	with open(temporary_filename, "wb") as file:
+		write(file)
+		file.flush()
+		os.fsync(file.fileno())
+	os.replace(temporary_filename, filename)
+	# the rename is only durable once the directory entry is on disk too
+	directory = os.open(os.path.dirname(filename), os.O_RDONLY)
+	try:
+		os.fsync(directory)
+	finally:
+		os.close(directory)
+
+def save_paths(filename, paths):
+	# in-memory paths for the interactive backend, stored as one vertex array plus the length of each path
+	def write(file):
+		np.savez(file, vertices=np.concatenate(paths) if paths else np.zeros((0, 2)), lengths=np.array([len(path) for path in paths], dtype=np.int64))
+	write_atomically(filename, write)
+
+def load_paths(filename):
+	with np.load(filename) as arrays:
+		return np.split(arrays["vertices"], np.cumsum(arrays["lengths"])[:-1])
+
+def save_checkpoint(checkpoint, checkpoint_path=CHECKPOINT_PATH):
+	checkpoint = {**checkpoint, "saved_at": time.time()}
+	checkpoint["checksum"] = hashlib.sha256(json.dumps(checkpoint, sort_keys=True).encode("utf-8")).hexdigest()
+	write_atomically(checkpoint_path, lambda file: file.write(json.dumps(checkpoint).encode("utf-8")))
+
+def load_checkpoint(checkpoint_path=CHECKPOINT_PATH):
+	# the last checkpoint, or None if there isn't a valid one
+	try:
+		with open(checkpoint_path, encoding="utf-8") as file:
+			checkpoint = json.load(file)
+	except FileNotFoundError:
+		return None
+	except ValueError as e:
+		logging.error(f"Ignoring unreadable checkpoint: {e}")
+		return None
+
+	checksum = checkpoint.pop("checksum", None)
+	if checksum != hashlib.sha256(json.dumps(checkpoint, sort_keys=True).encode("utf-8")).hexdigest():
+		logging.error("Ignoring checkpoint with a bad checksum")
+		return None
+
+	# the file the plot was made from must still be there, unchanged
+	source = checkpoint["paths_file"] if checkpoint["backend"] == "interactive" else checkpoint["source_svg"]
+	if not os.path.exists(source) or file_hash(source) != checkpoint["source_hash"]:
+		logging.error(f"Ignoring checkpoint, {source} is missing or has changed")
+		return None
+
+	return checkpoint
+
+def clear_checkpoint(checkpoint_path=CHECKPOINT_PATH):
+	if os.path.exists(checkpoint_path):
+		os.remove(checkpoint_path)
+
+#--------------------------------------------#
+
+
+
+#--------------------------------------------#
+#-------------- PLOT SCHEDULER --------------#
+#--------------------------------------------#
+
+import queue
+import threading
+
+from log import create_log, timed_stage
+from plotter import InteractivePlotter, configure_options, AXIDRAW_PAUSED_CODE
+
+class PlotScheduler:
+	# runs the button actions one at a time on a single worker thread, so the gpio callbacks return immediately
+	# states: idle -> fetching -> rendering -> plotting -> homing -> idle or paused
+
+	IDLE = "idle"
+	FETCHING = "fetching"
+	RENDERING = "rendering"
+	PLOTTING = "plotting"
+	PAUSED = "paused"
+	HOMING = "homing"
+
+	def __init__(self, axi, prerenderer, backend=PLOT_BACKEND, checkpoint_path=CHECKPOINT_PATH):
+		self.axi = axi
+		self.prerenderer = prerenderer
+		self.backend = backend
+		self.checkpoint_path = checkpoint_path
+		self.checkpoint = None	# the current plot's checkpoint
+		self.checkpointed_at = 0
+		self.plotter = InteractivePlotter(axi)
+		self.plotter.on_progress = self.save_progress
+		self.output_svg = None	# resume svg returned by plot_run
+		self.state = self.IDLE
+		self.lock = threading.Lock()
+		self.commands = queue.Queue()
+		self.pending = set()	# queued or running commands, so repeated presses are only queued once
+		self.cancel_event = threading.Event()
+		self.thread = None
+
+	def start(self):
+		self.thread = threading.Thread(target=self.loop, name="scheduler", daemon=True)
+		self.thread.start()
+
+	def stop(self):
+		self.commands.put(None)
+		if self.thread is not None:
+			self.thread.join()
+
+	def wait(self):
+		# block until every queued command has been handled
+		self.commands.join()
+
+	def get_state(self):
+		with self.lock:
+			return self.state
+
+	def set_state(self, state):
+		with self.lock:
+			self.state = state
+		logging.info(f"Scheduler state: {state}")
+
+	#--- button callbacks - these only queue work and return ---#
+
+	def run(self):
+		state = self.get_state()
+		if state in (self.FETCHING, self.RENDERING):
+			logging.info("Run pressed while the plot is being prepared, ignoring it")
+		elif state in (self.PLOTTING, self.HOMING):
+			# the machine is busy, so get the next svg ready instead of queueing another plot on the same sheet
+			logging.info("Run pressed while plotting, refreshing the pre-rendered svg")
+			self.prerenderer.request_refresh()
+		else:
+			self.submit("run")
+
+	def resume(self):
+		# only a paused plot can be resumed - a press queued during a plot would restart it as soon as it was paused
+		state = self.get_state()
+		if state != self.PAUSED:
+			logging.info(f"Resume pressed while {state}, ignoring it")
+		else:
+			self.submit("resume")
+
+	def disengage(self):
+		# doubles as cancel while a plot is being prepared or drawn
+		state = self.get_state()
+		if state in (self.FETCHING, self.RENDERING, self.PLOTTING):
+			self.cancel()
+		else:
+			self.submit("disengage")
+
+	def cancel(self):
+		logging.info("Cancelling the current job")
+		self.cancel_event.set()
+		self.plotter.pause()
+		if self.backend != "interactive" and self.get_state() == self.PLOTTING:
+			logging.info("plot_run can't be interrupted from here, press the pause button on the AxiDraw")
+
+	def submit(self, command):
+		with self.lock:
+			if command in self.pending:
+				logging.info(f"Ignoring {command}, it is already queued or running")
+				return
+			self.pending.add(command)
+		self.commands.put(command)
+
+	#--- worker ---#
+
+	def loop(self):
+		while True:
+			command = self.commands.get()
+			try:
+				if command is None:
+					return
+				self.cancel_event.clear()
+				getattr(self, f"do_{command}")()
+			except Exception as e:
+				logging.exception(e)
+				self.set_state(self.PAUSED if self.can_resume() else self.IDLE)
+			finally:
+				# only accept the same command again once it has finished, so presses while it runs are coalesced
+				with self.lock:
+					self.pending.discard(command)
+				self.commands.task_done()
+
+	def do_run(self):
+		started_at = time.monotonic()
+
+		create_log()
+
+		# use the svg prepared in the background, building it now if it isn't ready yet
+		if self.prerenderer.get_prepared() is None:
+			self.set_state(self.FETCHING)
+		prepared = self.prerenderer.take(on_render=lambda: self.set_state(self.RENDERING))
+		svg_filename = prepared["filename"]
+		logging.info(f"Using {svg_filename}, built {time.monotonic() - prepared['built_at']:.0f}s ago in {prepared['build_seconds']:.2f}s")
+
+		if self.cancel_event.is_set():
+			self.set_state(self.PAUSED if self.can_resume() else self.IDLE)
+			return
+
+		logging.info("Starting axidraw control")
+		self.set_state(self.PLOTTING)
+
+		self.start_checkpoint(prepared)
+
+		if self.backend == "interactive":
+			self.plotter.load(prepared["paths"])
+			with timed_stage("plot_run", backend="interactive") as timing:
+				self.plotter.plot(started_at)
+				timing["time_to_first_stroke"] = self.plotter.time_to_first_stroke
+
+		else:
+			with timed_stage("plot_setup", svg_bytes=os.path.getsize(svg_filename)):
+				self.axi.plot_setup(svg_filename)
+				configure_options(self.axi)
+			logging.info(f"Time to plot_run: {time.monotonic() - started_at:.2f}s")
+
+			with timed_stage("plot_run", backend="svg"):
+				self.output_svg = self.axi.plot_run(True)
+
+		self.home()
+
+	def do_resume(self):
+		if not self.can_resume():
+			logging.info("Nothing to resume")
+			return
+
+		create_log()
+
+		logging.info("Resuming plot")
+		self.set_state(self.PLOTTING)
+
+		if self.backend == "interactive":
+			self.plotter.plot()
+
+		else:
+			self.axi.plot_setup(self.output_svg)
+			configure_options(self.axi)
+
+			self.axi.options.mode = "res_plot"
+			self.output_svg = self.axi.plot_run(True)
+
+		self.home()
+
+	def do_disengage(self):
+		self.axi.plot_setup()
+		self.axi.options.mode = "align"
+		self.axi.plot_run()
+		self.output_svg = None
+		self.plotter.load([])
+		self.checkpoint = None
+		clear_checkpoint(self.checkpoint_path)
+		self.set_state(self.IDLE)
+
+	def home(self):
+		paused = self.plotter.paused() if self.backend == "interactive" else self.axi.errors.code == AXIDRAW_PAUSED_CODE
+
+		# fetch and render the next svg while the carriage travels home
+		self.set_state(self.HOMING)
+		self.prerenderer.request_refresh()
+
+		if self.backend == "interactive":
+			self.plotter.home()
+		else:
+			self.axi.plot_setup(self.output_svg)
+			self.axi.options.mode = "res_home"
+			self.output_svg = self.axi.plot_run(True)
+			if not paused:
+				self.output_svg = None
+
+		if paused:
+			self.save_progress(force=True)
+		else:
+			self.checkpoint = None
+			clear_checkpoint(self.checkpoint_path)
+
+		self.set_state(self.PAUSED if paused else self.IDLE)
+
+	def can_resume(self):
+		if self.backend == "interactive":
+			return self.plotter.paused()
+		return self.output_svg is not None
+
+	#--- checkpoints ---#
+
+	def start_checkpoint(self, prepared):
+		# record what is being plotted before the pen moves, so a reboot can pick it up without mongodb
+		if self.backend == "interactive":
+			paths_file = os.path.join(os.path.dirname(self.checkpoint_path), "plot_paths.npz")
+			save_paths(paths_file, prepared["paths"])
+			self.checkpoint = {"backend": "interactive", "source_svg": prepared["filename"], "paths_file": paths_file, "source_hash": file_hash(paths_file)}
+		else:
+			self.checkpoint = {"backend": "svg", "source_svg": prepared["filename"], "source_hash": file_hash(prepared["filename"])}
+		self.save_progress(force=True)
+
+	def save_progress(self, force=False):
+		# save at most every CHECKPOINT_INTERVAL_SECONDS while plotting
+		if self.checkpoint is None or (not force and time.monotonic() - self.checkpointed_at < CHECKPOINT_INTERVAL_SECONDS):
+			return
+		if self.backend == "interactive":
+			self.checkpoint.update(cursor=self.plotter.cursor, vertex=self.plotter.vertex, position=self.plotter.position())
+		else:
+			self.checkpoint.update(resume_svg=self.output_svg)
+		save_checkpoint(self.checkpoint, self.checkpoint_path)
+		self.checkpointed_at = time.monotonic()
+
+	def restore(self):
+		# pick up a plot from the last valid checkpoint, e.g. after a reboot
+		checkpoint = load_checkpoint(self.checkpoint_path)
+		if checkpoint is None:
+			return False
+		if checkpoint["backend"] != self.backend:
+			logging.error(f"Ignoring checkpoint from the {checkpoint['backend']} backend")
+			return False
+
+		if self.backend == "interactive":
+			self.plotter.load(load_paths(checkpoint["paths_file"]), checkpoint.get("cursor", 0), checkpoint.get("vertex", 0))
+			logging.info(f"Restored checkpoint at vertex {self.plotter.vertex + 1} of path {self.plotter.cursor + 1} of {len(self.plotter.paths)}, pen at {checkpoint.get('position')}")
+		elif checkpoint.get("resume_svg") is not None:
+			self.output_svg = checkpoint["resume_svg"]
+			logging.info(f"Restored checkpoint with resume data for {checkpoint['source_svg']}")
+		else:
+			# plot_run only reports progress when it stops, so there is nothing to resume from after a power cut
+			logging.warning(f"Checkpoint for {checkpoint['source_svg']} has no resume data, replace the sheet and press run to plot again")
+			clear_checkpoint(self.checkpoint_path)
+			return False
+
+		self.checkpoint = checkpoint
+		logging.info("Move the carriage to the home position, then press resume")
+		self.set_state(self.PAUSED)
+		return True
+
+#--------------------------------------------#
@@ -0,0 +1,25 @@
+import os
+import sys
+import logging
+
+import pytest
+
+# the modules live at the top of the repo rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import log
+import prerender
+
+@pytest.fixture(autouse=True)
+def directory(tmp_path, monkeypatch):
+	# keep logs and svgs written by the code under test out of the repo
+	monkeypatch.setattr(log, "DIRECTORY_PATH", str(tmp_path))
+	monkeypatch.setattr(log, "timing_filename", None)
+	monkeypatch.setattr(log, "current_timestamp", None)
+	monkeypatch.setattr(prerender, "DIRECTORY_PATH", str(tmp_path))
+	handlers = logging.root.handlers
+	yield tmp_path
+	for handler in logging.root.handlers:
+		if handler not in handlers:
+			handler.close()
+	logging.root.handlers = handlers
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+from pymongo.errors import PyMongoError
+
+from config import ATLAS_DOCUMENT_LIMIT
+from data import get_data
+
+def document(index, timestamp=None):
+	# shaped like the mongodb documents, with a field get_data shouldn't pull
+	return {
+		"_id": f"document-{index}",
+		"timestamp": index * 60000 if timestamp is None else timestamp,
+		"pos": [{"x": index, "y": step} for step in range(3)],
+		"visitor": f"visitor-{index}"
+	}
+
+class RecordingCollection:
+	# passes find through to a mongomock collection, keeping the queries it was sent
+
+	def __init__(self, collection):
+		self.collection = collection
+		self.queries = []
+
+	def find(self, query, *args, **kwargs):
+		self.queries.append(query)
+		return self.collection.find(query, *args, **kwargs)
+
+class FailingCollection:
+
+	def find(self, *args, **kwargs):
+		raise PyMongoError("atlas is unreachable")
+
+@pytest.fixture
+def collection():
+	return mongomock.MongoClient()["wts-artyard"]["data"]
+
+@pytest.fixture
+def cache_path(tmp_path):
+	return str(tmp_path / "cache" / "documents.sqlite")
+
+def test_first_pull_caches_the_newest_documents_with_only_the_fields_used(collection, cache_path):
+	collection.insert_many([document(index) for index in range(ATLAS_DOCUMENT_LIMIT + 10)])
+
+	documents = get_data(collection, cache_path)
+
+	assert len(documents) == ATLAS_DOCUMENT_LIMIT
+	assert [item["_id"] for item in documents] == [f"document-{index}" for index in reversed(range(10, ATLAS_DOCUMENT_LIMIT + 10))]
+	assert all(set(item) == {"_id", "pos", "timestamp"} for item in documents)
+	assert documents[0]["pos"] == document(ATLAS_DOCUMENT_LIMIT + 9)["pos"]
+
+def test_second_pull_only_fetches_documents_newer_than_the_cache(collection, cache_path):
+	collection.insert_many([document(index) for index in range(5)])
+	get_data(collection, cache_path)
+
+	collection.insert_one(document(5))
+	recording = RecordingCollection(collection)
+	documents = get_data(recording, cache_path)
+
+	assert recording.queries == [{"timestamp": {"$gt": 4 * 60000}}]
+	assert [item["_id"] for item in documents] == [f"document-{index}" for index in reversed(range(6))]
+
+def test_falls_back_to_the_cache_when_mongodb_fails(collection, cache_path):
+	collection.insert_many([document(index) for index in range(5)])
+	cached = get_data(collection, cache_path)
+
+	assert get_data(FailingCollection(), cache_path) == cached
+
+def test_falls_back_to_an_empty_cache(cache_path):
+	assert get_data(FailingCollection(), cache_path) == []
+
+def test_datetime_timestamps(collection, cache_path):
+	start = datetime(2024, 5, 1, 12, 0)
+	collection.insert_many([document(index, start + timedelta(minutes=index)) for index in range(3)])
+	documents = get_data(collection, cache_path)
+
+	assert [item["timestamp"] for item in documents] == [start + timedelta(minutes=index) for index in reversed(range(3))]
+
+	collection.insert_one(document(3, start + timedelta(minutes=3)))
+	recording = RecordingCollection(collection)
+	documents = get_data(recording, cache_path)
+
+	assert recording.queries == [{"timestamp": {"$gt": start + timedelta(minutes=2)}}]
+	assert [item["_id"] for item in documents] == [f"document-{index}" for index in reversed(range(4))]
@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+
+from config import SVG_DPI
+from plotter import InteractivePlotter, FakeAxiDraw, estimate_plot
+
+def square_paths():
+	# three strokes in svg pixels
+	return [
+		np.array([[100, 100], [200, 100], [200, 200]]),
+		np.array([[300, 300], [400, 300]]),
+		np.array([[500, 500], [600, 600], [700, 500], [800, 600]])
+	]
+
+def strokes(axi):
+	# every vertex drawn, in order
+	return [vertex for command in axi.commands if command[0] == "draw_path" for vertex in command[1]]
+
+def test_plots_every_path_in_inches():
+	axi = FakeAxiDraw()
+	plotter = InteractivePlotter(axi)
+	plotter.load(square_paths())
+
+	assert plotter.plot()
+	assert plotter.finished()
+	assert not plotter.paused()
+	assert strokes(axi) == [tuple(point / SVG_DPI) for path in square_paths() for point in path]
+	assert plotter.position() == [8, 6]
+
+def test_long_paths_are_sent_in_runs_that_share_their_ends(monkeypatch):
+	import plotter as plotter_module
+	monkeypatch.setattr(plotter_module, "PLOT_CHUNK_VERTICES", 3)
+	axi = FakeAxiDraw()
+	plotter = InteractivePlotter(axi)
+	progress = []
+	plotter.on_progress = lambda: progress.append((plotter.cursor, plotter.vertex))
+	plotter.load(square_paths()[2:])
+
+	assert plotter.plot()
+	path = [tuple(point / SVG_DPI) for point in square_paths()[2]]
+	assert [command[1] for command in axi.commands if command[0] == "draw_path"] == [path[:3], path[2:]]
+	assert progress == [(0, 2), (0, 3), (1, 0)]
+
+def test_load_inside_a_path_carries_on_from_that_vertex():
+	axi = FakeAxiDraw()
+	plotter = InteractivePlotter(axi)
+	plotter.load(square_paths(), cursor=2, vertex=1)
+
+	assert plotter.position() == [6, 6]
+	assert plotter.plot()
+	assert strokes(axi) == [tuple(point / SVG_DPI) for point in square_paths()[2][1:]]
+
+def test_home_lifts_the_pen_and_disconnects():
+	axi = FakeAxiDraw()
+	plotter = InteractivePlotter(axi)
+	plotter.load(square_paths())
+	plotter.plot()
+	plotter.home()
+
+	assert axi.commands[-2:] == [("moveto", 0, 0), ("disconnect",)]
+	assert axi.pen_is_up
+
+def test_pause_button_stops_before_the_next_path_and_resume_carries_on():
+	axi = FakeAxiDraw()
+	plotter = InteractivePlotter(axi)
+	plotter.load(square_paths())
+
+	# press the axidraw's pause button while the first path is drawn
+	def press_once():
+		plotter.on_progress = None
+		axi.button_presses = 1
+	plotter.on_progress = press_once
+
+	assert not plotter.plot()
+	assert plotter.cursor == 1
+	assert plotter.paused()
+	assert plotter.position() == [2, 2]
+
+	axi.commands.clear()
+	assert plotter.plot()
+	assert plotter.finished()
+	assert strokes(axi) == [tuple(point / SVG_DPI) for path in square_paths()[1:] for point in path]
+
+def test_pause_from_another_thread():
+	axi = FakeAxiDraw()
+	plotter = InteractivePlotter(axi)
+	plotter.load(square_paths())
+	plotter.on_progress = plotter.pause
+
+	assert not plotter.plot()
+	assert plotter.cursor == 1
+
+def test_load_at_a_cursor_skips_the_finished_paths():
+	axi = FakeAxiDraw()
+	plotter = InteractivePlotter(axi)
+	plotter.load(square_paths(), cursor=2)
+
+	assert plotter.plot()
+	assert strokes(axi) == [tuple(point / SVG_DPI) for point in square_paths()[2]]
+
+def test_failed_connect_raises():
+	axi = FakeAxiDraw()
+	axi.connect = lambda: False
+	plotter = InteractivePlotter(axi)
+	plotter.load(square_paths())
+
+	with pytest.raises(RuntimeError):
+		plotter.plot()
+
+def test_error_mid_plot_sends_the_carriage_home():
+	axi = FakeAxiDraw()
+	axi.kill_after = 2
+	plotter = InteractivePlotter(axi)
+	plotter.load(square_paths())
+
+	# the first path has two segments, so the second path is cut short
+	with pytest.raises(RuntimeError):
+		plotter.plot()
+	assert plotter.cursor == 1
+	assert axi.commands[-2:] == [("moveto", 0, 0), ("disconnect",)]
+
+def test_estimate_runs_in_preview_mode():
+	axi = FakeAxiDraw()
+	axi.button_presses = 1
+	estimate = estimate_plot(axi, "output.svg")
+
+	assert axi.commands == [("plot_setup", "output.svg"), ("plot_run", "plot")]
+	assert axi.options.preview
+	assert axi.errors.code == 0
+	assert estimate["estimated_seconds"] == 0
+	assert estimate["pendown_distance_m"] == 0
+	assert estimate["total_distance_m"] == 0
+	assert estimate["pen_lifts"] == 0
@@ -0,0 +1,44 @@
+import threading
+
+import prerender
+from prerender import Prerenderer
+
+def documents():
+	return [{"_id": 0, "timestamp": 0, "pos": [{"x": -4 + step * 0.1, "y": 4 + step * 0.2} for step in range(20)]}]
+
+def test_take_waits_for_the_build_under_way_instead_of_fetching_again(directory, monkeypatch):
+	gate = threading.Event()
+	fetching = threading.Event()
+	calls = []
+	def get_data():
+		calls.append(threading.current_thread().name)
+		fetching.set()
+		assert gate.wait(5)
+		return documents()
+	monkeypatch.setattr(prerender, "get_data", get_data)
+
+	prerenderer = Prerenderer(backend="svg")
+	worker = threading.Thread(target=prerenderer.refresh, name="prerender")
+	worker.start()
+	assert fetching.wait(5)
+
+	taken = []
+	visitor = threading.Thread(target=lambda: taken.append(prerenderer.take()), name="scheduler")
+	visitor.start()
+	gate.set()
+	worker.join()
+	visitor.join()
+
+	assert calls == ["prerender"]
+	assert taken == [prerenderer.get_prepared()]
+
+def test_take_builds_when_nothing_is_prepared(directory, monkeypatch):
+	monkeypatch.setattr(prerender, "get_data", documents)
+	prerenderer = Prerenderer(backend="svg")
+	rendered = []
+
+	prepared = prerenderer.take(on_render=lambda: rendered.append(True))
+
+	assert prepared is prerenderer.get_prepared()
+	assert rendered == [True]
+	assert prerenderer.take() is prepared
@@ -0,0 +1,49 @@
+import numpy as np
+
+from render import deduplicate_paths, pendown_distance
+
+def line(x0, x1, spacing=None):
+	# horizontal stroke at y = 500, with a vertex every spacing pixels if given
+	xs = np.arange(x0, x1 + 1e-9, spacing) if spacing else np.array([x0, x1])
+	return np.column_stack((xs, np.full(len(xs), 500.0)))
+
+def test_one_overdraw_is_allowed_however_the_first_pass_was_cut_up():
+	paths = [line(500, 600, spacing=1.2), line(500, 600)]
+	deduplicated = deduplicate_paths(paths, pen_width=2, max_overdraws=1)
+
+	assert pendown_distance(deduplicated) == pendown_distance(paths)
+
+def test_a_third_pass_is_dropped():
+	paths = [line(500, 600, spacing=1.2), line(500, 600), line(500, 600)]
+	deduplicated = deduplicate_paths(paths, pen_width=2, max_overdraws=1)
+
+	assert len(deduplicated) == 2
+	assert np.isclose(pendown_distance(deduplicated), 200, atol=1.3)
+
+def test_long_overdrawn_runs_split_the_stroke():
+	paths = [line(100, 300), line(100, 300), line(0, 400)]
+	deduplicated = deduplicate_paths(paths, pen_width=2, max_overdraws=1, min_gap=25)
+
+	assert [path.tolist() for path in deduplicated[2:]] == [[[0, 500], [100, 500]], [[300, 500], [400, 500]]]
+
+def test_short_overdrawn_runs_are_drawn_anyway():
+	paths = [line(100, 110), line(100, 110), line(0, 400)]
+	deduplicated = deduplicate_paths(paths, pen_width=2, max_overdraws=1, min_gap=25)
+
+	assert [path.tolist() for path in deduplicated[2:]] == [[[0, 500], [400, 500]]]
+
+def test_crossing_and_parallel_strokes_are_kept():
+	paths = [
+		line(0, 200),
+		np.array([[100.0, 400], [100, 600]]),	# crossing
+		np.array([[0.0, 505], [200, 505]]),		# parallel, further than the pen width away
+		np.array([[0.0, 400], [200, 600]])		# more than the angle tolerance apart
+	]
+	deduplicated = deduplicate_paths(paths, pen_width=2, max_overdraws=0, angle_tolerance=15, min_gap=0)
+
+	assert [path.tolist() for path in deduplicated] == [path.tolist() for path in paths]
+
+def test_zero_length_segments_and_single_points_are_left_out():
+	paths = [np.array([[0.0, 0], [0, 0], [10, 0]]), np.array([[50.0, 50]])]
+
+	assert [path.tolist() for path in deduplicate_paths(paths)] == [[[0, 0], [10, 0]]]
@@ -0,0 +1,302 @@
+import os
+import time
+import threading
+
+import pytest
+
+import prerender
+from prerender import Prerenderer
+from plotter import FakeAxiDraw
+from scheduler import PlotScheduler
+from buttons import create_button
+
+def documents():
+	# three short trajectories in data coordinates, shaped like the mongodb documents
+	return [
+		{"_id": index, "timestamp": index, "pos": [{"x": -4 + 3 * index + step * 0.1, "y": 4 + step * 0.2 * (index + 1)} for step in range(20)]}
+		for index in range(3)
+	]
+
+class Data:
+	# stands in for get_data, blocking while the gate is closed so tests can press buttons mid-fetch
+
+	def __init__(self):
+		self.gate = threading.Event()
+		self.gate.set()
+		self.calls = 0
+
+	def __call__(self):
+		self.calls += 1
+		assert self.gate.wait(5)
+		return documents()
+
+class PausingAxiDraw(FakeAxiDraw):
+	# presses the axidraw's pause button after a number of moves
+
+	def __init__(self, pause_after):
+		super().__init__()
+		self.pause_after = pause_after
+
+	def draw_path(self, vertex_list):
+		super().draw_path(vertex_list)
+		self.pause_after -= 1
+		if self.pause_after == 0:
+			self.button_presses = 1
+
+@pytest.fixture
+def data(monkeypatch):
+	data = Data()
+	monkeypatch.setattr(prerender, "get_data", data)
+	return data
+
+def create_scheduler(directory, axi=None, backend="svg"):
+	scheduler = PlotScheduler(axi or FakeAxiDraw(), Prerenderer(backend=backend), backend=backend, checkpoint_path=str(directory / "checkpoints" / "plot_checkpoint.json"))
+	scheduler.states = []
+	set_state = scheduler.set_state
+	def record_state(state):
+		scheduler.states.append(state)
+		set_state(state)
+	scheduler.set_state = record_state
+	scheduler.start()
+
+	buttons = {}
+	for name, pin, action in (("run", 14, scheduler.run), ("resume", 24, scheduler.resume), ("disengage", 25, scheduler.disengage)):
+		buttons[name] = create_button(pin, fake=True)
+		buttons[name].when_pressed = action
+	return scheduler, buttons
+
+def wait_for(condition, timeout=5):
+	deadline = time.monotonic() + timeout
+	while not condition():
+		assert time.monotonic() < deadline, "timed out"
+		time.sleep(0.01)
+
+def plot_runs(axi, mode="plot"):
+	return [command for command in axi.commands if command == ("plot_run", mode)]
+
+def segments(axi):
+	# line segments drawn by the interactive backend
+	return sum(len(command[1]) - 1 for command in axi.commands if command[0] == "draw_path")
+
+def test_run_fetches_renders_plots_and_homes(directory, data):
+	scheduler, buttons = create_scheduler(directory)
+	buttons["run"].press()
+	scheduler.wait()
+
+	assert scheduler.states == ["fetching", "rendering", "plotting", "homing", "idle"]
+	svg_filename = scheduler.prerenderer.get_prepared()["filename"]
+	assert scheduler.axi.commands[:2] == [("plot_setup", svg_filename), ("plot_run", "plot")]
+	assert scheduler.axi.commands[-1] == ("plot_run", "res_home")
+	assert not scheduler.can_resume()
+
+def test_run_with_a_prerendered_svg_goes_straight_to_plotting(directory, data):
+	scheduler, buttons = create_scheduler(directory)
+	scheduler.prerenderer.refresh()
+	buttons["run"].press()
+	scheduler.wait()
+
+	assert scheduler.states == ["plotting", "homing", "idle"]
+	assert data.calls == 1
+
+def test_run_presses_while_preparing_the_plot_are_coalesced(directory, data):
+	scheduler, buttons = create_scheduler(directory)
+	data.gate.clear()
+	buttons["run"].press()
+	buttons["run"].press()	# queued behind the first, before the worker picks it up
+	wait_for(lambda: scheduler.get_state() == "fetching")
+	buttons["run"].press()
+	data.gate.set()
+	scheduler.wait()
+
+	assert len(plot_runs(scheduler.axi)) == 1
+	assert scheduler.get_state() == "idle"
+
+def test_run_press_while_plotting_refreshes_the_next_svg(directory, data):
+	scheduler, buttons = create_scheduler(directory)
+	refreshes = []
+	scheduler.prerenderer.request_refresh = lambda: refreshes.append(scheduler.get_state())
+	plot_run = scheduler.axi.plot_run
+	def press_during_plot(output=False):
+		if scheduler.axi.options.__dict__.get("mode", "plot") == "plot":
+			buttons["run"].press()
+		return plot_run(output)
+	scheduler.axi.plot_run = press_during_plot
+
+	buttons["run"].press()
+	scheduler.wait()
+
+	assert len(plot_runs(scheduler.axi)) == 1
+	assert refreshes[0] == "plotting"
+
+def test_pause_and_resume_with_the_svg_backend(directory, data):
+	scheduler, buttons = create_scheduler(directory)
+	scheduler.axi.button_presses = 1
+	buttons["run"].press()
+	scheduler.wait()
+
+	assert scheduler.get_state() == "paused"
+	assert scheduler.can_resume()
+
+	buttons["resume"].press()
+	scheduler.wait()
+
+	assert plot_runs(scheduler.axi, "res_plot") == [("plot_run", "res_plot")]
+	assert scheduler.states[-3:] == ["plotting", "homing", "idle"]
+	assert not scheduler.can_resume()
+
+def test_pause_and_resume_with_the_interactive_backend_carries_on_from_the_cursor(directory, data):
+	scheduler, buttons = create_scheduler(directory, PausingAxiDraw(pause_after=3), backend="interactive")
+	buttons["run"].press()
+	scheduler.wait()
+
+	assert scheduler.get_state() == "paused"
+	cursor = scheduler.plotter.cursor
+	paths = scheduler.prerenderer.get_prepared()["paths"]
+	assert 0 < cursor < len(paths)
+	assert segments(scheduler.axi) == sum(len(path) - 1 for path in paths[:cursor])
+
+	scheduler.axi.commands.clear()
+	buttons["resume"].press()
+	scheduler.wait()
+
+	assert scheduler.get_state() == "idle"
+	assert segments(scheduler.axi) == sum(len(path) - 1 for path in paths[cursor:])
+
+def test_repeated_resume_presses_are_coalesced(directory, data):
+	scheduler, buttons = create_scheduler(directory, PausingAxiDraw(pause_after=3), backend="interactive")
+	buttons["run"].press()
+	scheduler.wait()
+
+	gate = threading.Event()
+	connect = scheduler.axi.connect
+	def slow_connect():
+		assert gate.wait(5)
+		return connect()
+	scheduler.axi.connect = slow_connect
+	for _ in range(3):
+		buttons["resume"].press()
+	gate.set()
+	scheduler.wait()
+
+	assert scheduler.axi.commands.count(("connect",)) == 2
+	assert scheduler.get_state() == "idle"
+
+def test_resume_presses_while_plotting_are_ignored(directory, data):
+	scheduler, buttons = create_scheduler(directory, PausingAxiDraw(pause_after=3), backend="interactive")
+	draw_path = scheduler.axi.draw_path
+	def press_during_plot(vertex_list):
+		buttons["resume"].press()
+		draw_path(vertex_list)
+	scheduler.axi.draw_path = press_during_plot
+
+	buttons["run"].press()
+	scheduler.wait()
+
+	# the pause button stopped the plot, and stays stopped until resume is pressed again
+	assert scheduler.get_state() == "paused"
+	assert scheduler.axi.commands.count(("connect",)) == 1
+
+def test_disengage_cancels_a_plot_being_prepared(directory, data):
+	scheduler, buttons = create_scheduler(directory)
+	data.gate.clear()
+	buttons["run"].press()
+	wait_for(lambda: scheduler.get_state() == "fetching")
+	buttons["disengage"].press()
+	data.gate.set()
+	scheduler.wait()
+
+	assert plot_runs(scheduler.axi) == []
+	assert scheduler.get_state() == "idle"
+
+def test_disengage_clears_a_paused_plot(directory, data):
+	scheduler, buttons = create_scheduler(directory, PausingAxiDraw(pause_after=3), backend="interactive")
+	buttons["run"].press()
+	scheduler.wait()
+	buttons["disengage"].press()
+	scheduler.wait()
+
+	assert plot_runs(scheduler.axi, "align") == [("plot_run", "align")]
+	assert scheduler.get_state() == "idle"
+	assert not scheduler.can_resume()
+
+	buttons["resume"].press()
+	scheduler.wait()
+	assert scheduler.get_state() == "idle"
+
+def test_a_killed_interactive_plot_resumes_from_its_checkpoint_after_a_restart(directory, data, monkeypatch):
+	import plotter
+	import scheduler as scheduler_module
+	monkeypatch.setattr(scheduler_module, "CHECKPOINT_INTERVAL_SECONDS", 0)
+	monkeypatch.setattr(plotter, "PLOT_CHUNK_VERTICES", 4)
+
+	axi = FakeAxiDraw()
+	axi.kill_after = 25	# a power cut part way through the plot
+	killed, buttons = create_scheduler(directory, axi, backend="interactive")
+	buttons["run"].press()
+	killed.wait()
+	paths = killed.prerenderer.get_prepared()["paths"]
+	total = sum(len(path) - 1 for path in paths)
+	drawn = segments(axi)
+	assert 0 < drawn < total
+
+	# a fresh process, with nothing in memory but the checkpoint on disk
+	restarted, buttons = create_scheduler(directory, backend="interactive")
+	assert restarted.restore()
+	assert restarted.get_state() == "paused"
+	assert (restarted.plotter.cursor, restarted.plotter.vertex) == (killed.plotter.cursor, killed.plotter.vertex)
+	assert restarted.plotter.vertex > 0	# the checkpoint is inside a path
+
+	buttons["resume"].press()
+	restarted.wait()
+
+	assert restarted.get_state() == "idle"
+	assert [command[0] for command in restarted.axi.commands[:3]] == ["interactive", "connect", "draw_path"]
+	last_drawn = [command for command in axi.commands if command[0] == "draw_path"][-1][1][-1]
+	assert restarted.axi.commands[2][1][0] == last_drawn
+	assert segments(restarted.axi) == total - drawn
+	assert not os.path.exists(restarted.checkpoint_path)
+
+def test_checkpoints_inside_a_path_wait_for_the_interval(directory, data):
+	axi = FakeAxiDraw()
+	axi.kill_after = 25
+	killed, buttons = create_scheduler(directory, axi, backend="interactive")
+	buttons["run"].press()
+	killed.wait()
+
+	restarted, _ = create_scheduler(directory, backend="interactive")
+	assert restarted.restore()
+	assert (restarted.plotter.cursor, restarted.plotter.vertex) == (0, 0)
+
+def test_a_paused_svg_plot_resumes_from_its_checkpoint_after_a_restart(directory, data):
+	paused, buttons = create_scheduler(directory)
+	paused.axi.button_presses = 1
+	buttons["run"].press()
+	paused.wait()
+
+	restarted, buttons = create_scheduler(directory)
+	assert restarted.restore()
+	buttons["resume"].press()
+	restarted.wait()
+
+	assert restarted.axi.commands[:2] == [("plot_setup", "<svg/>"), ("plot_run", "res_plot")]
+	assert restarted.get_state() == "idle"
+
+def test_an_svg_checkpoint_without_resume_data_is_not_resumed(directory, data):
+	# plot_run only reports where it stopped when it pauses, so a plot killed mid-way has nothing to resume from
+	killed, buttons = create_scheduler(directory)
+	def power_cut(output=False):
+		raise RuntimeError("FakeAxiDraw killed")
+	killed.axi.plot_run = power_cut
+	buttons["run"].press()
+	killed.wait()
+	assert os.path.exists(killed.checkpoint_path)
+
+	restarted, buttons = create_scheduler(directory)
+	assert not restarted.restore()
+	assert restarted.get_state() == "idle"
+	assert not os.path.exists(restarted.checkpoint_path)
+
+	buttons["resume"].press()
+	restarted.wait()
+	assert plot_runs(restarted.axi, "res_plot") == []
+	assert plot_runs(restarted.axi) == []